@@ -10,6 +10,7 @@
 #include <llvm/Option/OptTable.h>
 #include <llvm/Option/Option.h>
 #include <llvm/Support/CommandLine.h>
+#include <llvm/Support/Endian.h>
 #include <llvm/Support/Error.h>
 #include <llvm/Support/FileSystem.h>
 #include <llvm/Support/Memory.h>
@@ -17,8 +18,15 @@
 #include <llvm/Support/PrettyStackTrace.h>
 #include <llvm/Support/SHA1.h>
 #include <llvm/Support/raw_ostream.h>
+#include <array>
+#include <atomic>
+#include <cinttypes>
 #include <cstdlib>
+#include <cstring>
 #include <dlfcn.h>
+#include <iterator>
+#include <mutex>
+#include <optional>
 #include <string>
 #include <type_traits>
 #include <unordered_map>
@@ -42,8 +50,229 @@ static StringRef getTranslationDir() {
 }
 
 namespace {
+// Binary catalog written by scripts/compile_catalog.py:
+//   header: magic, version, number of entries N, number of buckets B of the
+//           perfect hash and the offsets of the sections below, as
+//           little-endian uint32
+//   seeds: B uint32 bucket seeds of the perfect hash
+//   keys: N 6-byte keys, the first 48 bits of the SHA1 of the sources,
+//         stored in the slot given by the perfect hash
+//   offsets: N + 1 uint32 offsets of the translations in the blob
+//   blob: the unescaped UTF-8 translations, each followed by a NUL byte
+//   lengths: bitmap of the byte lengths of the sources
+//   filter: Bloom filter of the sources, probed at
+//           (lo32(H) + I * (hi32(H) | 1)) mod FilterBits for the FNV-1a 64
+//           hash H of a string and I < FilterHashes
+// The lengths and filter sections are empty if the sources were unknown.
+constexpr char CatalogMagic[8] = {'C', 'I', '1', '8', 'N', 'C', 'A', 'T'};
+constexpr uint32_t CatalogVersion = 3;
+constexpr size_t CatalogHeaderSize =
+    sizeof(CatalogMagic) + 13 * sizeof(uint32_t);
+constexpr size_t CatalogKeySize = 6;
+
+// The splitmix64 finalizer, see scripts/perfect_hash.py.
+static uint64_t mix64(uint64_t X) {
+  X += 0x9E3779B97F4A7C15ULL;
+  X = (X ^ (X >> 30)) * 0xBF58476D1CE4E5B9ULL;
+  X = (X ^ (X >> 27)) * 0x94D049BB133111EBULL;
+  return X ^ (X >> 31);
+}
+
+static uint64_t fnv1a64(StringRef Str) {
+  uint64_t H = 0xCBF29CE484222325ULL;
+  for (unsigned char C : Str) {
+    H ^= C;
+    H *= 0x100000001B3ULL;
+  }
+  return H;
+}
+
+// Kinds of strings, each with its own catalog shard <lang>.<shard>.catalog,
+// see scripts/compile_catalog.py.
+enum class StringKind { Diagnostic, Option, CommandLine, Special };
+constexpr const char *ShardNames[] = {"diag", "options", "cl", "special"};
+constexpr size_t NumShards = std::size(ShardNames);
+
+class Catalog {
+  std::unique_ptr<llvm::MemoryBuffer> Buffer;
+  const char *Seeds = nullptr;
+  const char *Keys = nullptr;
+  const char *Offsets = nullptr;
+  const char *Blob = nullptr;
+  uint32_t NumEntries = 0;
+  uint32_t NumBuckets = 0;
+  uint32_t BlobSize = 0;
+  // Prefilter, checked before hashing. Disabled if LengthsSize is zero.
+  const unsigned char *Lengths = nullptr;
+  const unsigned char *Filter = nullptr;
+  uint32_t LengthsSize = 0;
+  uint32_t FilterBits = 0;
+  uint32_t FilterHashes = 0;
+
+public:
+  // Return false if the catalog at Path is missing or older than the
+  // translation file it was compiled from.
+  static bool isUpToDate(const std::string &Path, const std::string &YAMLPath) {
+    using namespace llvm;
+    sys::fs::file_status Status, YAMLStatus;
+    if (sys::fs::status(Path, Status))
+      return false;
+    return sys::fs::status(YAMLPath, YAMLStatus) ||
+           YAMLStatus.getLastModificationTime() <=
+               Status.getLastModificationTime();
+  }
+
+  // Map the catalog at Path unless it is missing, invalid or out of date.
+  static std::unique_ptr<Catalog> load(const std::string &Path,
+                                       const std::string &YAMLPath) {
+    using namespace llvm;
+    if (!isUpToDate(Path, YAMLPath))
+      return nullptr;
+    auto File = MemoryBuffer::getFile(Path, /*IsText=*/false,
+                                      /*RequiresNullTerminator=*/false);
+    if (!File)
+      return nullptr;
+
+    StringRef Data = (*File)->getBuffer();
+    auto Field = [&](uint32_t Idx) -> uint64_t {
+      return support::endian::read32le(Data.data() + sizeof(CatalogMagic) +
+                                       Idx * sizeof(uint32_t));
+    };
+    if (Data.size() < CatalogHeaderSize ||
+        memcmp(Data.data(), CatalogMagic, sizeof(CatalogMagic)) != 0 ||
+        Field(0) != CatalogVersion) {
+      fprintf(stderr, "Invalid translation catalog: %s\n", Path.c_str());
+      return nullptr;
+    }
+    uint64_t Entries = Field(1);
+    uint64_t Buckets = Field(2);
+    uint64_t SeedsOffset = Field(3);
+    uint64_t KeysOffset = Field(4);
+    uint64_t OffsetsOffset = Field(5);
+    uint64_t BlobOffset = Field(6);
+    uint64_t Size = Field(7);
+    uint64_t LengthsOffset = Field(8);
+    uint64_t LengthsBytes = Field(9);
+    uint64_t FilterOffset = Field(10);
+    uint64_t Bits = Field(11);
+    if (Buckets == 0 || (Bits & (Bits - 1)) != 0 ||
+        (LengthsBytes != 0 && Bits == 0) ||
+        LengthsOffset + LengthsBytes > Data.size() ||
+        FilterOffset + Bits / 8 > Data.size() ||
+        SeedsOffset + Buckets * sizeof(uint32_t) > Data.size() ||
+        KeysOffset + Entries * CatalogKeySize > Data.size() ||
+        OffsetsOffset + (Entries + 1) * sizeof(uint32_t) > Data.size() ||
+        BlobOffset + Size > Data.size() ||
+        support::endian::read32le(Data.data() + OffsetsOffset +
+                                  Entries * sizeof(uint32_t)) != Size) {
+      fprintf(stderr, "Invalid translation catalog: %s\n", Path.c_str());
+      return nullptr;
+    }
+
+    auto Res = std::make_unique<Catalog>();
+    Res->Seeds = Data.data() + SeedsOffset;
+    Res->Keys = Data.data() + KeysOffset;
+    Res->Offsets = Data.data() + OffsetsOffset;
+    Res->Blob = Data.data() + BlobOffset;
+    Res->NumEntries = Entries;
+    Res->NumBuckets = Buckets;
+    Res->BlobSize = Size;
+    if (!getenv("CLANG_I18N_NO_PREFILTER")) {
+      Res->Lengths = Data.bytes_begin() + LengthsOffset;
+      Res->Filter = Data.bytes_begin() + FilterOffset;
+      Res->LengthsSize = LengthsBytes;
+      Res->FilterBits = Bits;
+      Res->FilterHashes = Field(12);
+    }
+    Res->Buffer = std::move(*File);
+    return Res;
+  }
+
+  // Return false if Src is certainly not a source of the catalog.
+  bool mayContain(StringRef Src) const {
+    if (NumEntries == 0)
+      return false;
+    if (LengthsSize == 0)
+      return true;
+    if (Src.size() >= uint64_t(LengthsSize) * 8 ||
+        !(Lengths[Src.size() / 8] >> (Src.size() % 8) & 1))
+      return false;
+    uint64_t H = fnv1a64(Src);
+    uint32_t H1 = H, H2 = (H >> 32) | 1;
+    for (uint32_t I = 0; I != FilterHashes; ++I) {
+      uint32_t Bit = (H1 + I * H2) & (FilterBits - 1);
+      if (!(Filter[Bit / 8] >> (Bit % 8) & 1))
+        return false;
+    }
+    return true;
+  }
+
+  std::optional<StringRef> lookup(llvm::ArrayRef<uint8_t> Digest) const {
+    using namespace llvm;
+    if (NumEntries == 0)
+      return std::nullopt;
+    uint64_t Key = 0;
+    for (size_t I = 0; I != CatalogKeySize; ++I)
+      Key = Key << 8 | Digest[I];
+    // A single probe of the minimal perfect hash. Keys that are not in the
+    // catalog land in an arbitrary slot and are rejected by the key compare.
+    uint64_t H = mix64(Key);
+    uint32_t Seed =
+        support::endian::read32le(Seeds + H % NumBuckets * sizeof(uint32_t));
+    uint64_t Slot = mix64(H ^ Seed) % NumEntries;
+    if (memcmp(Keys + Slot * CatalogKeySize, Digest.data(), CatalogKeySize))
+      return std::nullopt;
+    auto *Offset = Offsets + Slot * sizeof(uint32_t);
+    uint32_t Begin = support::endian::read32le(Offset);
+    uint32_t End = support::endian::read32le(Offset + sizeof(uint32_t));
+    if (Begin >= End || End > BlobSize)
+      return std::nullopt;
+    // Drop the NUL terminator.
+    return StringRef{Blob + Begin, End - Begin - 1};
+  }
+};
+
 class TranslationTable {
-  std::unordered_map<std::string, std::string> Table;
+  // Parsed .yml file, used when no catalog is available. With shards, it is
+  // loaded on the first lookup of a kind whose shard cannot be mapped.
+  mutable std::unordered_map<std::string, std::string> Table;
+  mutable std::once_flag TableLoaded;
+  // Path of the translation files without extension, <dir>/<lang>.
+  std::string Path;
+  // Mapped catalog, used instead of Table when available.
+  std::unique_ptr<Catalog> Full;
+  // Catalog shards, used instead of Table when all of them are up to date.
+  // Each shard is mapped by the first lookup of its kind.
+  bool Sharded = false;
+  mutable std::unique_ptr<Catalog> Shards[NumShards];
+  mutable std::once_flag ShardsLoaded[NumShards];
+
+  // Counters printed at exit if CLANG_I18N_STATS is set.
+  bool ShowStats = false;
+  mutable std::atomic<uint64_t> Lookups = 0;
+  mutable std::atomic<uint64_t> Filtered = 0;
+  mutable std::atomic<uint64_t> Hashed = 0;
+  mutable std::atomic<uint64_t> Translated = 0;
+  mutable std::atomic<uint32_t> ShardsMapped = 0;
+
+  void count(std::atomic<uint64_t> &Counter) const {
+    if (ShowStats)
+      Counter.fetch_add(1, std::memory_order_relaxed);
+  }
+
+  std::string getShardPath(size_t Idx) const {
+    return Path + "." + ShardNames[Idx] + ".catalog";
+  }
+
+  const Catalog *getShard(StringKind Kind) const {
+    auto Idx = static_cast<size_t>(Kind);
+    std::call_once(ShardsLoaded[Idx], [&] {
+      Shards[Idx] = Catalog::load(getShardPath(Idx), Path + ".yml");
+      if (Shards[Idx])
+        ShardsMapped.fetch_add(1, std::memory_order_relaxed);
+    });
+    return Shards[Idx].get();
+  }
 
   static void unescape(std::string &Str) {
     uint32_t Pos = 0;
@@ -78,29 +307,14 @@ class TranslationTable {
     Str = Str.c_str();
   }
 
-public:
-  static std::string Hash(StringRef Src) {
-    llvm::SHA1 S;
-    S.update(Src);
-    auto Res = S.result();
-    return llvm::toHex(Res).substr(0, 12);
-  }
-
-  TranslationTable() {
+  void loadYAML(const std::string &Path, bool DebugMode) const {
     using namespace llvm;
-    auto Lang = getLang();
-    if (Lang.empty() || Lang == "en_US" || Lang == "en_UK" || Lang == "C")
-      return;
-    auto TranslationDir = getTranslationDir();
-    auto Path = TranslationDir.str() + "/" + Lang.str() + ".yml";
     auto MapFile = MemoryBuffer::getFile(Path, true);
     if (!MapFile) {
       fprintf(stderr, "Failed to open translation file: %s\n", Path.c_str());
       return;
     }
 
-    bool DebugMode = getenv("CLANG_I18N_DEBUG") != nullptr;
-
     SmallVector<StringRef, 0> Lines;
     (*MapFile)->getBuffer().split(Lines, '\n');
     for (auto Line : Lines) {
@@ -121,16 +335,109 @@ public:
     }
   }
 
-  StringRef replace(StringRef Src) const {
+  StringRef lookupCatalogs(StringRef Src, StringKind Kind) const {
+    using namespace llvm;
+    std::optional<std::array<uint8_t, 20>> Digest;
+    auto Lookup = [&](const Catalog *C) -> std::optional<StringRef> {
+      if (!C || !C->mayContain(Src))
+        return std::nullopt;
+      if (!Digest) {
+        count(Hashed);
+        Digest = SHA1::hash(arrayRefFromStringRef(Src));
+      }
+      return C->lookup(*Digest);
+    };
+    std::optional<StringRef> Res;
+    if (!Sharded)
+      Res = Lookup(Full.get());
+    else {
+      // The special shard also holds the strings of unknown kind.
+      for (auto K : {Kind, StringKind::Special}) {
+        const Catalog *Shard = getShard(K);
+        // A shard that is invalid, or was updated after startup, falls back
+        // to the .yml file like a single catalog.
+        if (!Shard) {
+          std::call_once(TableLoaded,
+                         [&] { loadYAML(Path + ".yml", /*DebugMode=*/false); });
+          return lookupTable(Src);
+        }
+        Res = Lookup(Shard);
+        if (Res || K == StringKind::Special)
+          break;
+      }
+    }
+    if (!Digest)
+      count(Filtered);
+    return Res.value_or(Src);
+  }
+
+  StringRef lookupTable(StringRef Src) const {
+    count(Hashed);
     auto It = Table.find(Hash(Src.str()));
-    return It == Table.end() ? Src : It->second;
+    if (It != Table.end())
+      return It->second;
+    return Src;
+  }
+
+public:
+  static std::string Hash(StringRef Src) {
+    llvm::SHA1 S;
+    S.update(Src);
+    auto Res = S.result();
+    return llvm::toHex(Res).substr(0, 12);
+  }
+
+  TranslationTable() {
+    using namespace llvm;
+    ShowStats = getenv("CLANG_I18N_STATS") != nullptr;
+    auto Lang = getLang();
+    if (Lang.empty() || Lang == "en_US" || Lang == "en_UK" || Lang == "C")
+      return;
+    auto TranslationDir = getTranslationDir();
+    Path = TranslationDir.str() + "/" + Lang.str();
+
+    // The debug mode shows the hashes, which are only in the .yml file.
+    bool DebugMode = getenv("CLANG_I18N_DEBUG") != nullptr;
+    if (!DebugMode) {
+      Full = Catalog::load(Path + ".catalog", Path + ".yml");
+      if (Full)
+        return;
+      Sharded = true;
+      for (size_t I = 0; I != NumShards; ++I)
+        Sharded &= Catalog::isUpToDate(getShardPath(I), Path + ".yml");
+      if (Sharded)
+        return;
+    }
+    loadYAML(Path + ".yml", DebugMode);
+  }
+
+  ~TranslationTable() {
+    if (ShowStats)
+      fprintf(stderr,
+              "clang-i18n stats: %" PRIu64 " lookups, %" PRIu64
+              " rejected by the prefilter, %" PRIu64 " hashed, %" PRIu64
+              " translated, %" PRIu32 " shards mapped\n",
+              Lookups.load(), Filtered.load(), Hashed.load(), Translated.load(),
+              ShardsMapped.load());
+  }
+
+  StringRef replace(StringRef Src, StringKind Kind) const {
+    count(Lookups);
+    StringRef Res = Src;
+    if (Full || Sharded)
+      Res = lookupCatalogs(Src, Kind);
+    else
+      Res = lookupTable(Src);
+    if (Res.data() != Src.data())
+      count(Translated);
+    return Res;
   }
 };
 } // namespace
 
-static StringRef replace(StringRef Src) {
+static StringRef replace(StringRef Src, StringKind Kind) {
   static TranslationTable Table;
-  return Table.replace(Src);
+  return Table.replace(Src, Kind);
 }
 
 static void *getRealFuncAddrImpl(const char *ManagledName,
@@ -173,7 +480,7 @@ public:
       : raw_ostream(true, OS.get_kind()), OS(OS) {}
 
   void write_impl(const char *Ptr, size_t Size) override {
-    auto Rep = ::replace(StringRef{Ptr, Size});
+    auto Rep = ::replace(StringRef{Ptr, Size}, StringKind::Option);
     OS.write(Rep.data(), Rep.size());
   }
 
@@ -187,7 +494,7 @@ public:
       : raw_fd_ostream(0, false, true, outs().get_kind()) {}
 
   void write_impl(const char *Ptr, size_t Size) override {
-    auto Rep = ::replace(StringRef{Ptr, Size});
+    auto Rep = ::replace(StringRef{Ptr, Size}, StringKind::CommandLine);
     fwrite(Rep.data(), 1, Rep.size(), stdout);
   }
 };
@@ -208,7 +515,8 @@ void Diagnostic::FormatDiagnostic(SmallVectorImpl<char> &OutStr) const {
   }
 
   StringRef Diag =
-      ::replace(getDiags()->getDiagnosticIDs()->getDescription(getID()));
+      ::replace(getDiags()->getDiagnosticIDs()->getDescription(getID()),
+                StringKind::Diagnostic);
 
   FormatDiagnostic(Diag.begin(), Diag.end(), OutStr);
 }
@@ -362,7 +670,7 @@ void OptTable::printHelp(raw_ostream &OS, const char *Usage, const char *Title,
 
 INTERCEPTOR_ATTRIBUTE void setBugReportMsg(const char *Msg) {
   static auto RealFunc = getRealFuncAddr(&setBugReportMsg);
-  return RealFunc(::replace(Msg).data());
+  return RealFunc(::replace(Msg, StringKind::Special).data());
 }
 
 INTERCEPTOR_ATTRIBUTE
@@ -372,7 +680,8 @@ bool CheckBitcodeOutputToConsole(raw_ostream &OS) {
         "WARNING: You're attempting to print out a bitcode file.\n"
         "This is inadvisable as it may cause display problems. If\n"
         "you REALLY want to taste LLVM bitcode first-hand, you\n"
-        "can force output with the `-f' option.\n\n");
+        "can force output with the `-f' option.\n\n",
+        StringKind::Special);
     return true;
   }
   return false;
@@ -0,0 +1,145 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import asyncio
+import random
+import time
+import openai
+from metrics import approx_tokens
+
+
+def estimate_tokens(prompt):
+    # Rough estimate covering both the prompt and a reply of similar size.
+    return 2 * approx_tokens(prompt)
+
+
+class RateLimiter:
+    """Token bucket that admits `rate` units per minute (0 disables it).
+
+    The bucket holds at most one minute worth of units, matching the
+    per-minute quotas of most endpoints."""
+
+    def __init__(self, rate):
+        self.rate = rate / 60.0
+        self.capacity = rate
+        self.tokens = rate
+        self.last = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.last) * self.rate
+                )
+                self.last = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+def get_retry_after(e):
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncChat:
+    """Streams chat completions, retrying 429/5xx and connection errors with
+    exponential backoff. Replies found in `cache` are returned without a
+    request."""
+
+    def __init__(
+        self,
+        client,
+        model,
+        request_limiter,
+        token_limiter,
+        max_retries=8,
+        timeout=300,
+        base_delay=1.0,
+        max_delay=60.0,
+        cache=None,
+    ):
+        self.client = client
+        self.model = model
+        self.request_limiter = request_limiter
+        self.token_limiter = token_limiter
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cache = cache
+        self.retries = 0
+        self.failures = 0
+        self.endpoint = str(client.base_url)
+
+    async def chat(self, prompt, parser=None):
+        """Return the completion text, or "" if the request failed.
+
+        The streamed text is also fed to `parser`, which is reset before
+        each attempt."""
+        if self.cache is not None:
+            content = self.cache.get(self.model, self.endpoint, prompt)
+            if content is not None:
+                if parser is not None:
+                    parser.feed(content)
+                    parser.close()
+                return content
+        for attempt in range(self.max_retries + 1):
+            await self.request_limiter.acquire(1)
+            await self.token_limiter.acquire(estimate_tokens(prompt))
+            try:
+                completion = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    timeout=self.timeout,
+                    stream=True,
+                )
+                content = ""
+                if parser is not None:
+                    parser.reset()
+                async for chunk in completion:
+                    if len(chunk.choices) == 0:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content is not None:
+                        content += delta.content
+                        if parser is not None:
+                            parser.feed(delta.content)
+                if parser is not None:
+                    parser.close()
+                if self.cache is not None and len(content) != 0:
+                    self.cache.put(self.model, self.endpoint, prompt, content)
+                return content
+            except (
+                openai.RateLimitError,
+                openai.InternalServerError,
+                openai.APIConnectionError,
+            ) as e:
+                if attempt == self.max_retries:
+                    print(e)
+                    self.failures += 1
+                    return ""
+                self.retries += 1
+                delay = get_retry_after(e)
+                if delay is None:
+                    delay = min(self.base_delay * 2**attempt, self.max_delay)
+                    delay *= 0.5 + random.random()
+                await asyncio.sleep(delay)
+            except Exception as e:
+                print(e)
+                self.failures += 1
+                return ""
+        return ""
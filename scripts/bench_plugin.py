@@ -0,0 +1,332 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from compile_catalog import (
+    build_catalog,
+    read_shards,
+    read_sources,
+    read_translation,
+    split_translation,
+    write_catalog,
+)
+from i18n_common import compute_hash, read_corpus
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def truncate_translation(src, dst, entries):
+    """Copy the first `entries` entries (all if 0) of a translation file and
+    return the number of entries copied."""
+    count = 0
+    with open(src, encoding="utf-8") as fin, open(dst, "w", encoding="utf-8") as fout:
+        for line in fin:
+            if line.startswith("H"):
+                if entries != 0 and count == entries:
+                    break
+                count += 1
+            fout.write(line)
+    return count
+
+
+def prepare_translations(args, work_dir, corpus_map, shards):
+    """Write one translation directory per locale, size and layout, and
+    return the configurations using them."""
+    configs = []
+    for lang in args.langs.split(","):
+        for entries in [int(v) for v in args.entries.split(",")]:
+            size = str(entries) if entries != 0 else "all"
+            for layout in args.layouts.split(","):
+                translation_dir = os.path.join(work_dir, f"{lang}-{size}-{layout}")
+                os.makedirs(translation_dir)
+                path = os.path.join(translation_dir, lang + ".yml")
+                count = truncate_translation(
+                    os.path.join(args.i18n_dir, lang + ".yml"), path, entries
+                )
+                # Catalogs are written after the .yml file, so they are not
+                # considered out of date.
+                translation = read_translation(path)
+                sources = dict(corpus_map)
+                sources.update(read_sources(path))
+                stem = os.path.join(translation_dir, lang)
+                if layout == "catalog":
+                    write_catalog(
+                        stem + ".catalog", build_catalog(translation, sources)
+                    )
+                elif layout == "sharded":
+                    for name, part in split_translation(translation, shards).items():
+                        write_catalog(
+                            f"{stem}.{name}.catalog", build_catalog(part, sources)
+                        )
+                configs.append(
+                    {
+                        "config": f"{lang}/{layout}/{size}",
+                        "lang": lang,
+                        "layout": layout,
+                        "entries": count,
+                        "translation_dir": translation_dir,
+                    }
+                )
+    return configs
+
+
+def write_sources(work_dir, diagnostics):
+    """Write a C file without diagnostics and one with `diagnostics`
+    unused variable warnings."""
+    clean = os.path.join(work_dir, "clean.c")
+    with open(clean, "w") as f:
+        f.write("int main(void) { return 0; }\n")
+    noisy = os.path.join(work_dir, "noisy.c")
+    with open(noisy, "w") as f:
+        f.write("int main(void) {\n")
+        for idx in range(diagnostics):
+            f.write(f"  int unused{idx};\n")
+        f.write("  return 0;\n}\n")
+    return clean, noisy
+
+
+def run_once(cmd, env):
+    """Run a command and return its wall time, its max RSS (KiB) and its
+    exit code."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    _, status, rusage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return elapsed, rusage.ru_maxrss, proc.returncode
+
+
+def count_diagnostics(cmd):
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    return proc.stderr.count(": warning: ")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def bench(cmd, env, runs, warmup):
+    """Return the distribution of the wall time (ms) and the max RSS of
+    `runs` runs of a command."""
+    times = []
+    rss = []
+    failures = 0
+    for idx in range(warmup + runs):
+        elapsed, max_rss, code = run_once(cmd, env)
+        if idx < warmup:
+            continue
+        times.append(elapsed * 1000)
+        rss.append(max_rss)
+        failures += code != 0
+    return {
+        "min": min(times),
+        "p50": percentile(times, 0.5),
+        "p90": percentile(times, 0.9),
+        "p99": percentile(times, 0.99),
+        "max": max(times),
+        "mean": sum(times) / len(times),
+        "max_rss_kib": max(rss),
+        "failures": failures,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Return the (configuration, workload, metric) whose median time or max
+    RSS grew by more than `tolerance` (a fraction of the baseline)."""
+    with open(baseline_path) as f:
+        baseline = {(r["config"], r["workload"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        key = (result["config"], result["workload"])
+        if key not in baseline:
+            continue
+        for metric in ["p50", "max_rss_kib"]:
+            expected = baseline[key][metric]
+            if result[metric] > expected * (1 + tolerance):
+                regressions.append((*key, metric, expected, result[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the cost of preloading the plugin into clang and "
+        "opt invocations"
+    )
+    parser.add_argument("--clang", default="clang", help="clang executable")
+    parser.add_argument("--opt", default="opt", help="opt executable")
+    parser.add_argument(
+        "--clang-plugin",
+        default="/usr/local/lib/libclang-i18n.so",
+        help="Path to libclang-i18n.so",
+    )
+    parser.add_argument(
+        "--llvm-plugin",
+        default="/usr/local/lib/libllvm-i18n.so",
+        help="Path to libllvm-i18n.so",
+    )
+    parser.add_argument(
+        "--i18n-dir",
+        default=os.path.join(root_dir, "i18n"),
+        help="Directory of the translation files",
+    )
+    parser.add_argument(
+        "--corpus",
+        default=os.path.join(root_dir, "corpus.txt"),
+        help="Path to the corpus file, for the prefilter of the catalogs",
+    )
+    parser.add_argument(
+        "--langs", default="zh_CN", help="Comma-separated locales to benchmark"
+    )
+    parser.add_argument(
+        "--entries",
+        default="1000,0",
+        help="Comma-separated numbers of translation entries (0: all)",
+    )
+    parser.add_argument(
+        "--layouts",
+        default="yml,catalog",
+        help="Comma-separated translation layouts: yml (no catalog), catalog "
+        "and sharded (needs --index)",
+    )
+    parser.add_argument(
+        "--index", help="SQLite index written by collect.py --index, for sharding"
+    )
+    parser.add_argument(
+        "--diagnostics",
+        type=int,
+        default=200,
+        help="Number of warnings of the diagnostics workload",
+    )
+    parser.add_argument("--runs", type=int, default=50, help="Runs per command")
+    parser.add_argument(
+        "--warmup", type=int, default=2, help="Discarded runs per command"
+    )
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument(
+        "--baseline",
+        help="Results of an earlier --json run. Exit with an error if the "
+        "median time or max RSS of a command grew by more than --tolerance",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed growth relative to the baseline",
+    )
+    args = parser.parse_args()
+
+    layouts = args.layouts.split(",")
+    for layout in layouts:
+        if layout not in ["yml", "catalog", "sharded"]:
+            parser.error(f"unknown layout: {layout}")
+    if "sharded" in layouts and args.index is None:
+        parser.error("the sharded layout needs --index")
+    shards = read_shards(args.index) if args.index is not None else None
+    corpus_map = {compute_hash(s): s for s in read_corpus(args.corpus)}
+
+    results = []
+    per_diagnostic = dict()
+    diagnostics = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        clean, noisy = write_sources(work_dir, args.diagnostics)
+        workloads = []
+        if shutil.which(args.clang) is not None:
+            workloads += [
+                ("syntax-only", [args.clang, "-fsyntax-only", "-Wall", clean], "clang"),
+                ("diagnostics", [args.clang, "-fsyntax-only", "-Wall", noisy], "clang"),
+                ("clang --help", [args.clang, "--help"], "clang"),
+            ]
+            diagnostics = count_diagnostics(workloads[1][1])
+        else:
+            print(f"{args.clang} not found, skipping the clang workloads")
+        if shutil.which(args.opt) is not None:
+            workloads.append(("opt --help", [args.opt, "--help"], "llvm"))
+        else:
+            print(f"{args.opt} not found, skipping the opt workloads")
+        plugins = {"clang": args.clang_plugin, "llvm": args.llvm_plugin}
+        for tool, plugin in plugins.items():
+            if not os.path.exists(plugin):
+                print(f"{plugin} not found, only the baseline of {tool} is run")
+
+        configs = [{"config": "baseline"}]
+        configs.append({"config": "en_US", "lang": "en_US", "entries": 0})
+        configs += prepare_translations(args, work_dir, corpus_map, shards)
+
+        print(
+            f"{'config':<24} {'workload':<14} {'p50(ms)':>8} {'p90(ms)':>8} "
+            f"{'max(ms)':>8} {'rss(MiB)':>8}"
+        )
+        for config in configs:
+            for workload, cmd, tool in workloads:
+                env = dict(os.environ)
+                env.pop("LD_PRELOAD", None)
+                if config["config"] != "baseline":
+                    if not os.path.exists(plugins[tool]):
+                        continue
+                    env["LD_PRELOAD"] = plugins[tool]
+                    env["CLANG_I18N_LANG"] = config["lang"]
+                    if "translation_dir" in config:
+                        env["CLANG_I18N_TRANSLATION_DIR"] = config["translation_dir"]
+                result = {
+                    **{k: v for k, v in config.items() if k != "translation_dir"},
+                    "workload": workload,
+                    **bench(cmd, env, args.runs, args.warmup),
+                }
+                results.append(result)
+                print(
+                    f"{config['config']:<24} {workload:<14} {result['p50']:>8.1f} "
+                    f"{result['p90']:>8.1f} {result['max']:>8.1f} "
+                    f"{result['max_rss_kib'] / 1024:>8.1f}",
+                    flush=True,
+                )
+
+    # The formatting cost of a diagnostic is the extra time of the workload
+    # with diagnostics over the one without.
+    medians = {(r["config"], r["workload"]): r["p50"] for r in results}
+    for config in configs:
+        name = config["config"]
+        if (name, "diagnostics") in medians and diagnostics != 0:
+            per_diagnostic[name] = (
+                (medians[name, "diagnostics"] - medians[name, "syntax-only"])
+                * 1000
+                / diagnostics
+            )
+            print(f"{name}: {per_diagnostic[name]:.1f} us per diagnostic")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "runs": args.runs,
+                    "diagnostics": diagnostics,
+                    "results": results,
+                    "per_diagnostic_us": per_diagnostic,
+                },
+                f,
+                indent=2,
+            )
+    if args.baseline is not None:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for config, workload, metric, expected, actual in regressions:
+            print(
+                f"Regression: {config}/{workload}: {metric} {actual:.1f}, "
+                f"was {expected:.1f}"
+            )
+        if len(regressions) != 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
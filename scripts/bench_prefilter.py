@@ -0,0 +1,110 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+stats_pattern = re.compile(
+    r"clang-i18n stats: (\d+) lookups, (\d+) rejected by the prefilter, "
+    r"(\d+) hashed, (\d+) translated"
+)
+stats_fields = ["lookups", "filtered", "hashed", "translated"]
+
+
+def run_once(cmd, env):
+    """Run a command and return its wall time, stdout and the plugin
+    counters summed over all of its processes."""
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, capture_output=True)
+    elapsed = time.perf_counter() - start
+    stats = dict.fromkeys(stats_fields, 0)
+    for match in stats_pattern.finditer(proc.stderr.decode("utf-8", "replace")):
+        for field, value in zip(stats_fields, match.groups()):
+            stats[field] += int(value)
+    return elapsed, proc.stdout, stats
+
+
+def bench(name, cmd, plugin, args):
+    results = dict()
+    outputs = dict()
+    for mode in ["prefilter", "no-prefilter"]:
+        env = dict(os.environ)
+        env["LD_PRELOAD"] = plugin
+        env["CLANG_I18N_LANG"] = args.lang
+        env["CLANG_I18N_STATS"] = "1"
+        if args.translation_dir is not None:
+            env["CLANG_I18N_TRANSLATION_DIR"] = args.translation_dir
+        if mode == "no-prefilter":
+            env["CLANG_I18N_NO_PREFILTER"] = "1"
+        times = []
+        for _ in range(args.runs):
+            elapsed, outputs[mode], stats = run_once(cmd, env)
+            times.append(elapsed)
+        results[mode] = {
+            "median": statistics.median(times),
+            "min": min(times),
+            "mean": statistics.mean(times),
+            **stats,
+        }
+    if outputs["prefilter"] != outputs["no-prefilter"]:
+        print(f"{name}: the output differs without the prefilter", file=sys.stderr)
+        results["output_mismatch"] = True
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the cost of --help output with and without the "
+        "catalog prefilter"
+    )
+    parser.add_argument("--clang", default="clang", help="clang executable")
+    parser.add_argument("--opt", default="opt", help="opt executable")
+    parser.add_argument(
+        "--clang-plugin",
+        default="/usr/local/lib/libclang-i18n.so",
+        help="Path to libclang-i18n.so",
+    )
+    parser.add_argument(
+        "--llvm-plugin",
+        default="/usr/local/lib/libllvm-i18n.so",
+        help="Path to libllvm-i18n.so",
+    )
+    parser.add_argument("--lang", default="zh_CN", help="Locale of the translations")
+    parser.add_argument(
+        "--translation-dir", help="Directory of the translation files and catalogs"
+    )
+    parser.add_argument("--runs", type=int, default=20, help="Runs per command")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    benchmarks = [
+        ("clang --help", [args.clang, "--help"], args.clang_plugin),
+        ("opt --help", [args.opt, "--help"], args.llvm_plugin),
+    ]
+    results = dict()
+    print(
+        f"{'command':<14} {'mode':<13} {'median(ms)':>10} {'hashed':>8} {'filtered':>9}"
+    )
+    for name, cmd, plugin in benchmarks:
+        results[name] = bench(name, cmd, plugin, args)
+        for mode in ["prefilter", "no-prefilter"]:
+            res = results[name][mode]
+            print(
+                f"{name:<14} {mode:<13} {res['median'] * 1000:>10.1f} "
+                f"{res['hashed']:>8} {res['filtered']:>9}"
+            )
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import argparse
+import glob
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from stub_server import answer_batch
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(script_dir)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub(args, port):
+    cmd = [
+        sys.executable,
+        os.path.join(script_dir, "stub_server.py"),
+        "--port",
+        str(port),
+        "--mode",
+        args.mode,
+        "--latency",
+        str(args.latency),
+        "--tokens-per-second",
+        str(args.tokens_per_second),
+        "--chunk-size",
+        str(args.chunk_size),
+        "--error-rate",
+        str(args.error_rate),
+        "--rate-limit-rate",
+        str(args.rate_limit_rate),
+        "--retry-after",
+        str(args.retry_after),
+    ]
+    server = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError("The stub server failed to start")
+            time.sleep(0.05)
+
+
+def run_script(name, script_args, env):
+    cmd = [sys.executable, os.path.join(script_dir, name)] + script_args
+    start = time.monotonic()
+    subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.monotonic() - start
+
+
+def bench_translate(args, work_dir, env, batch_size, concurrency):
+    output = os.path.join(work_dir, f"translate-{batch_size}-{concurrency}.yml")
+    metrics_path = output + ".metrics.json"
+    script_args = [
+        args.corpus_subset,
+        args.prompt,
+        args.errata,
+        output,
+        str(batch_size),
+        "--fixed-batch-size",
+        "--concurrency",
+        str(concurrency),
+        "--metrics-interval",
+        "0",
+        "--metrics-json",
+        metrics_path,
+    ]
+    if args.mask:
+        script_args.append("--mask")
+    wall_time = run_script("translate.py", script_args, env)
+    with open(metrics_path) as f:
+        report = json.load(f)
+    return {
+        "pipeline": "translate",
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "strings": args.limit,
+        "accepted": report["accepted"],
+        "wall_time": wall_time,
+        "strings_per_second": report["accepted"] / wall_time,
+        "latency_p50": report["latency"]["p50"],
+        "latency_p99": report["latency"]["p99"],
+        "retries": report.get("retries", 0),
+    }
+
+
+def bench_batch(args, work_dir, env, batch_size):
+    prefix = os.path.join(work_dir, f"batch-{batch_size}")
+    write_time = run_script(
+        "translate_batch.py",
+        [
+            args.corpus_subset,
+            args.prompt,
+            prefix,
+            "--batch-size",
+            str(batch_size),
+        ],
+        env,
+    )
+    results = []
+    for shard in sorted(glob.glob(prefix + "-*.jsonl")):
+        results.append(shard + ".out")
+        answer_batch(shard, results[-1], args.mode)
+    output = prefix + ".yml"
+    import_time = run_script(
+        "translate_batch_import.py",
+        [args.corpus_subset, args.errata, output]
+        + results
+        + ["--manifest", prefix + ".manifest.json"],
+        env,
+    )
+    with open(output) as f:
+        accepted = sum(1 for line in f if line.startswith("H"))
+    wall_time = write_time + import_time
+    return {
+        "pipeline": "batch",
+        "batch_size": batch_size,
+        "concurrency": 0,
+        "strings": args.limit,
+        "accepted": accepted,
+        "wall_time": wall_time,
+        "strings_per_second": accepted / wall_time,
+        "write_time": write_time,
+        "import_time": import_time,
+    }
+
+
+def config_name(result):
+    return (
+        f"{result['pipeline']}/batch_size={result['batch_size']}"
+        f"/concurrency={result['concurrency']}"
+    )
+
+
+def compare(results, baseline_path, tolerance):
+    """Return the configurations that are slower than in the baseline by more
+    than `tolerance` (a fraction of the baseline throughput)."""
+    with open(baseline_path) as f:
+        baseline = {config_name(r): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        name = config_name(result)
+        if name not in baseline:
+            continue
+        expected = baseline[name]["strings_per_second"]
+        if result["strings_per_second"] < expected * (1 - tolerance):
+            regressions.append((name, expected, result["strings_per_second"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the translation pipeline against the local "
+        "stub server"
+    )
+    parser.add_argument(
+        "--corpus",
+        default=os.path.join(root_dir, "corpus.txt"),
+        help="Path to the corpus file",
+    )
+    parser.add_argument(
+        "--prompt",
+        default=os.path.join(root_dir, "i18n", "zh_CN.prompt"),
+        help="Path to the prompt file",
+    )
+    parser.add_argument("--errata", help="Path to the errata file (default: no errata)")
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=1000,
+        help="Number of corpus strings translated by each run",
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        default="10,20,40",
+        help="Comma-separated batch sizes to benchmark",
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,4,16",
+        help="Comma-separated concurrency levels to benchmark",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Also benchmark translate_batch.py and translate_batch_import.py",
+    )
+    parser.add_argument("--mask", action="store_true", help="Pass --mask")
+    parser.add_argument(
+        "--mode",
+        choices=["echo", "pseudo"],
+        default="pseudo",
+        help="Replies of the stub server",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Stub latency (seconds)"
+    )
+    parser.add_argument(
+        "--tokens-per-second",
+        type=float,
+        default=0,
+        help="Stub generation speed (0: unlimited)",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=16, help="Stub streaming chunk size"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0, help="Stub 500 error rate"
+    )
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=0, help="Stub 429 error rate"
+    )
+    parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=0.1,
+        help="Retry-After of the stub 429 responses (seconds)",
+    )
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument(
+        "--baseline",
+        help="Results of an earlier --json run. Exit with an error if a "
+        "configuration got slower by more than --tolerance",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed throughput loss relative to the baseline",
+    )
+    parser.add_argument(
+        "--min-acceptance",
+        type=float,
+        default=1.0,
+        help="Exit with an error if a run accepts a smaller fraction of the "
+        "strings (the stub replies are always valid)",
+    )
+    args = parser.parse_args()
+
+    batch_sizes = [int(v) for v in args.batch_sizes.split(",")]
+    concurrency_levels = [int(v) for v in args.concurrency.split(",")]
+    port = free_port()
+    env = dict(os.environ)
+    env["LLM_ENDPOINT"] = f"http://127.0.0.1:{port}/v1"
+    env["LLM_MODEL"] = "stub"
+    env["LLM_TOKEN"] = "stub"
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        args.corpus_subset = os.path.join(work_dir, "corpus.txt")
+        with open(args.corpus) as f:
+            corpus = f.read().splitlines()[: args.limit]
+        args.limit = len(corpus)
+        with open(args.corpus_subset, "w") as f:
+            f.write("\n".join(corpus) + "\n")
+        if args.errata is None:
+            args.errata = os.path.join(work_dir, "empty.errata")
+            open(args.errata, "w").close()
+
+        server = start_stub(args, port)
+        try:
+            print(
+                f"{'pipeline':<10} {'batch':>5} {'conc':>4} {'accepted':>9} "
+                f"{'wall(s)':>8} {'strings/s':>10}"
+            )
+            configs = [(bs, c) for bs in batch_sizes for c in concurrency_levels]
+            configs += [(bs, 0) for bs in batch_sizes] if args.batch else []
+            for batch_size, concurrency in configs:
+                if concurrency == 0:
+                    result = bench_batch(args, work_dir, env, batch_size)
+                else:
+                    result = bench_translate(
+                        args, work_dir, env, batch_size, concurrency
+                    )
+                results.append(result)
+                print(
+                    f"{result['pipeline']:<10} {batch_size:>5} {concurrency:>4} "
+                    f"{result['accepted']:>4}/{result['strings']:<4} "
+                    f"{result['wall_time']:>8.2f} "
+                    f"{result['strings_per_second']:>10.1f}",
+                    flush=True,
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json is not None:
+        stub = {
+            key: getattr(args, key)
+            for key in [
+                "mode",
+                "latency",
+                "tokens_per_second",
+                "chunk_size",
+                "error_rate",
+                "rate_limit_rate",
+            ]
+        }
+        with open(args.json, "w") as f:
+            json.dump(
+                {"strings": args.limit, "stub": stub, "results": results},
+                f,
+                indent=2,
+            )
+    incomplete = [
+        r for r in results if r["accepted"] < r["strings"] * args.min_acceptance
+    ]
+    for result in incomplete:
+        print(
+            f"Incomplete: {config_name(result)}: accepted "
+            f"{result['accepted']}/{result['strings']} strings"
+        )
+    if args.baseline is not None:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for name, expected, actual in regressions:
+            print(f"Regression: {name}: {actual:.1f} strings/s, was {expected:.1f}")
+        if len(regressions) != 0:
+            sys.exit(1)
+    if len(incomplete) != 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
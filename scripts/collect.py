@@ -3,152 +3,54 @@
 # This file is licensed under the MIT License.
 # See the LICENSE file for more information.
 
-import sys
+import argparse
+import hashlib
+import json
 import os
 import subprocess
+import sys
 import ast
+import re
+import sqlite3
+from collections import namedtuple
+from contextlib import nullcontext
+from functools import partial
+from multiprocessing import Pool
+from i18n_common import compute_hash, read_corpus
 
-llvm_src_path = sys.argv[1]
-llvm_build_path = sys.argv[2]
-output_path = sys.argv[3]
-strings = []
+# Bump when the extraction logic changes to invalidate existing caches.
+CACHE_VERSION = 4
 
 diagnostic_extractor = """
-#define DIAG(ENUM, CLASS, DEFAULT_SEVERITY, DESC, GROUP, SFINAE, NOWERROR, SHOWINSYSHEADER, SHOWINSYSMACRO, DEFERRABLE, CATEGORY) DESC
+#define DIAG(ENUM, CLASS, DEFAULT_SEVERITY, DESC, GROUP, SFINAE, NOWERROR, SHOWINSYSHEADER, SHOWINSYSMACRO, DEFERRABLE, CATEGORY) ENUM CATEGORY DESC
+CLANG_I18N_SOURCE "DiagnosticCommonKinds.inc"
 #include "clang/Basic/DiagnosticCommonKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticDriverKinds.inc"
 #include "clang/Basic/DiagnosticDriverKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticFrontendKinds.inc"
 #include "clang/Basic/DiagnosticFrontendKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticSerializationKinds.inc"
 #include "clang/Basic/DiagnosticSerializationKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticLexKinds.inc"
 #include "clang/Basic/DiagnosticLexKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticParseKinds.inc"
 #include "clang/Basic/DiagnosticParseKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticASTKinds.inc"
 #include "clang/Basic/DiagnosticASTKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticCommentKinds.inc"
 #include "clang/Basic/DiagnosticCommentKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticCrossTUKinds.inc"
 #include "clang/Basic/DiagnosticCrossTUKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticSemaKinds.inc"
 #include "clang/Basic/DiagnosticSemaKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticAnalysisKinds.inc"
 #include "clang/Basic/DiagnosticAnalysisKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticRefactoringKinds.inc"
 #include "clang/Basic/DiagnosticRefactoringKinds.inc"
+CLANG_I18N_SOURCE "DiagnosticInstallAPIKinds.inc"
 #include "clang/Basic/DiagnosticInstallAPIKinds.inc"
 """
 
-diagnostic_strings = (
-    subprocess.check_output(
-        [
-            "cc",
-            "-E",
-            "-P",
-            "-I",
-            os.path.join(llvm_build_path, "tools/clang/include"),
-            "-",
-        ],
-        input=diagnostic_extractor.encode(),
-    )
-    .decode()
-    .splitlines()
-)
-print("Diagnostic:", len(diagnostic_strings))
-for line in diagnostic_strings:
-    strings.append(ast.literal_eval(line))
-
-
-def get_custom_messages(
-    path, keyword, suffix=False, trunc_for_suffix=False, max_len=10000000
-):
-    count = 0
-    global strings
-
-    for r, ds, fs in os.walk(os.path.join(llvm_src_path, path)):
-        for f in fs:
-            if (
-                not f.endswith(".cpp")
-                and not f.endswith(".h")
-                and not (f.startswith("__") and "." not in f)
-            ):
-                continue
-            if "test" in r:
-                continue
-            with open(os.path.join(r, f)) as src:
-                srcstr = src.read()
-            if keyword not in srcstr:
-                continue
-            pos = 0
-            while True:
-                pos = srcstr.find(keyword, pos + 1)
-                if pos == -1:
-                    break
-                beg = srcstr.find('"', pos)
-                if beg == -1:
-                    break
-                depth = 0
-                while True:
-                    ch = srcstr[pos]
-                    if ch == "(":
-                        depth += 1
-                    elif ch == ")":
-                        depth -= 1
-                        if depth == 0:
-                            break
-                    if pos == len(srcstr) - 1:
-                        break
-                    pos += 1
-                expr = srcstr[beg:pos]
-                if srcstr[beg - 1 : beg + 2] != 'R"(':
-                    expr = expr.replace("\n", "")
-                else:
-                    expr = '""' + expr + '""'
-                if len(expr) == 0:
-                    continue
-                if trunc_for_suffix:
-                    npos = expr.rfind('"')
-                    if npos != -1:
-                        expr = expr[: npos + 1]
-                substr = None
-                try:
-                    substr = ast.literal_eval(expr)
-                except Exception:
-                    pass
-                if not isinstance(substr, str):
-                    substr = None
-                if substr is None:
-                    for i in range(1, len(expr)):
-                        try:
-                            if suffix:
-                                substr = expr[i:].replace("\n", "")
-                            else:
-                                substr = expr[:-i].replace("\n", "")
-                            if "\\ " in substr:
-                                substr = None
-                                continue
-                            substr = ast.literal_eval(substr)
-                            if not isinstance(substr, str):
-                                substr = None
-                                continue
-                            if substr is not None:
-                                break
-                        except Exception:
-                            pass
-                if substr is None:
-                    continue
-                while substr.startswith("(") and substr.endswith(")"):
-                    substr = substr[1:-1]
-                if (
-                    len(substr) != 0
-                    and not (
-                        ("-" in substr) and (" " not in substr) and ("<" not in substr)
-                    )
-                    and len(substr) < max_len
-                ):
-                    strings.append(substr)
-                    count += 1
-    return count
-
-
-custom_diagnostic_strings_count = 0
-custom_diagnostic_strings_count += get_custom_messages("clang/lib", ".getCustomDiagID(")
-custom_diagnostic_strings_count += get_custom_messages(
-    "libcxx/include", "_LIBCPP_DIAGNOSE_WARNING("
-)
-print("Custom Diagnostic:", custom_diagnostic_strings_count)
-
 option_extractor = """
 #define OPTION(PREFIXES_OFFSET, PREFIXED_NAME_OFFSET, ID, KIND, GROUP, ALIAS, ALIASARGS, FLAGS, VISIBILITY, PARAM, HELPTEXT, HELPTEXTSFORVARIANTS, METAVAR, VALUES) HELPTEXT
 #include "clang/Driver/Options.inc"
@@ -156,142 +58,558 @@ option_extractor = """
 #define OPTION(PREFIXES_OFFSET, PREFIXED_NAME_OFFSET, ID, KIND, GROUP, ALIAS, ALIASARGS, FLAGS, VISIBILITY, PARAM, HELPTEXT, HELPTEXTSFORVARIANTS, METAVAR, VALUES) HELPTEXTSFORVARIANTS
 #include "clang/Driver/Options.inc"
 """
-option_strings = (
-    subprocess.check_output(
-        [
-            "cc",
-            "-E",
-            "-P",
-            "-I",
-            os.path.join(llvm_build_path, "tools/clang/include"),
-            "-",
-        ],
-        input=option_extractor.encode(),
-    )
-    .decode()
-    .splitlines()
-)
-print("Option:", len(option_strings))
-for line in option_strings:
-    if '"' in line:
-        res = None
-        try:
-            res = ast.literal_eval(line)
-
-        except Exception:
-            pass
-        if res is None:
-            pos1 = line.find('"')
-            pos2 = line.rfind('"')
-            if pos1 != -1 and pos2 != -1:
-                res = ast.literal_eval(line[pos1 : pos2 + 1])
-        if len(res) != 0:
-            strings.append(res)
-inline_options_count = 0
-inline_options_count += get_custom_messages(".", "cl::desc(")
-inline_options_count += get_custom_messages(".", "clEnumValN(", suffix=True)
-inline_options_count += get_custom_messages(".", "clEnumVal(", suffix=True)
-inline_options_count += get_custom_messages(".", "cl::OptionCategory")
-inline_options_count += get_custom_messages(".", "cl::OptionCategory", suffix=True)
-inline_options_count += get_custom_messages(
-    "llvm/include/llvm/Target", "addLiteralOption(", suffix=True
-)
-print("Inline Option:", inline_options_count)
 
-# Passes description using legacy pass manager
-old_passes_count = 0
-old_passes_count += get_custom_messages(
-    ".", "INITIALIZE_PASS_BEGIN(", suffix=True, trunc_for_suffix=True
-)
-old_passes_count += get_custom_messages(
-    ".", "INITIALIZE_PASS_END(", suffix=True, trunc_for_suffix=True
-)
-old_passes_count += get_custom_messages(
-    ".", "INITIALIZE_PASS(", suffix=True, trunc_for_suffix=True
+Extractor = namedtuple(
+    "Extractor",
+    ["group", "path", "keyword", "suffix", "trunc_for_suffix", "max_len", "line"],
+    defaults=[False, False, 10000000, False],
 )
-old_passes_count += get_custom_messages(
-    ".", "static RegisterPass<", suffix=True, trunc_for_suffix=True
-)
-old_passes_count += get_custom_messages("llvm/lib", "_NAME ", max_len=100)
-print("Old Passes:", old_passes_count)
-desc_count = get_custom_messages(".", "cl::ParseCommandLineOptions(", suffix=True)
-print("Program Desc:", desc_count)
-sched_count = 0
-sched_count += get_custom_messages(
-    "llvm/lib", "static MachineSchedRegistry", suffix=True, trunc_for_suffix=True
-)
-sched_count += get_custom_messages(
-    "llvm/lib", "static RegisterScheduler", suffix=True, trunc_for_suffix=True
-)
-print("Schedulers:", sched_count)
-debug_count = get_custom_messages("llvm/lib", "DEBUG_COUNTER(", suffix=True)
-print("Debug Counter:", debug_count)
-reg_alloc_count = get_custom_messages(
-    "llvm/lib/CodeGen", "static RegisterRegAlloc", suffix=True, trunc_for_suffix=True
-)
-print("Register Allocators:", reg_alloc_count)
-
-# Special strings
-strings.append("clang LLVM compiler")
-strings.append("OVERVIEW: ")
-strings.append("USAGE: ")
-strings.append("OPTIONS:\n")
-strings.append("SUBCOMMANDS:\n\n")
-strings.append('  Type "')
-strings.append(' <subcommand> --help" to get more help on a specific ' "subcommand")
-strings.append(" [options]")
-strings.append("SUBCOMMAND '")
-strings.append(" [subcommand]")
-strings.append("= *cannot print option value*\n")
-strings.append("*no default*")
-strings.append(" (default: ")
-strings.append("= *unknown option value*\n")
-strings.append(
-    "PLEASE submit a bug report to https://github.com/llvm/llvm-project/issues/ and include the crash backtrace, preprocessed source, and associated run script.\n"
+
+extractors = [
+    Extractor("Custom Diagnostic", "clang/lib", ".getCustomDiagID("),
+    Extractor("Custom Diagnostic", "libcxx/include", "_LIBCPP_DIAGNOSE_WARNING("),
+    Extractor("Inline Option", ".", "cl::desc("),
+    Extractor("Inline Option", ".", "clEnumValN(", suffix=True),
+    Extractor("Inline Option", ".", "clEnumVal(", suffix=True),
+    Extractor("Inline Option", ".", "cl::OptionCategory"),
+    Extractor("Inline Option", ".", "cl::OptionCategory", suffix=True),
+    Extractor(
+        "Inline Option", "llvm/include/llvm/Target", "addLiteralOption(", suffix=True
+    ),
+    # Passes description using legacy pass manager
+    Extractor(
+        "Old Passes", ".", "INITIALIZE_PASS_BEGIN(", suffix=True, trunc_for_suffix=True
+    ),
+    Extractor(
+        "Old Passes", ".", "INITIALIZE_PASS_END(", suffix=True, trunc_for_suffix=True
+    ),
+    Extractor(
+        "Old Passes", ".", "INITIALIZE_PASS(", suffix=True, trunc_for_suffix=True
+    ),
+    Extractor(
+        "Old Passes", ".", "static RegisterPass<", suffix=True, trunc_for_suffix=True
+    ),
+    # The argument of a macro definition ends with the line.
+    Extractor("Old Passes", "llvm/lib", "_NAME ", max_len=100, line=True),
+    Extractor("Program Desc", ".", "cl::ParseCommandLineOptions(", suffix=True),
+    Extractor(
+        "Schedulers",
+        "llvm/lib",
+        "static MachineSchedRegistry",
+        suffix=True,
+        trunc_for_suffix=True,
+    ),
+    Extractor(
+        "Schedulers",
+        "llvm/lib",
+        "static RegisterScheduler",
+        suffix=True,
+        trunc_for_suffix=True,
+    ),
+    Extractor("Debug Counter", "llvm/lib", "DEBUG_COUNTER(", suffix=True),
+    Extractor(
+        "Register Allocators",
+        "llvm/lib/CodeGen",
+        "static RegisterRegAlloc",
+        suffix=True,
+        trunc_for_suffix=True,
+    ),
+]
+
+
+class LiteralError(Exception):
+    pass
+
+
+cxx_token_pattern = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<comment>//[^\n]*|/\*.*?\*/)
+    |(?P<raw>(?:u8|u|U|L)?R"(?P<delim>[^()\\\s"]{0,16})\()
+    |(?P<string>(?:u8|u|U|L)?"(?P<body>(?:[^"\\\n]|\\.)*)")
+    |(?P<char>(?:u8|u|U|L)?'(?:[^'\\\n]|\\.)*')
+    |(?P<number>\.?[0-9](?:[eEpP][+-]|['\w.])*)
+    |(?P<ident>[A-Za-z_]\w*)
+    |(?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
 )
-strings.append(
-    "PLEASE submit a bug report to https://github.com/llvm/llvm-project/issues/ and include the crash backtrace.\n"
+
+cxx_escape_pattern = re.compile(
+    r"\\(?:([0-7]{1,3})|x([0-9A-Fa-f]+)|u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))",
+    re.DOTALL,
 )
-strings.append(
+
+cxx_simple_escapes = {
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "v": "\v",
+    "e": "\x1b",
+    "\\": "\\",
+    "'": "'",
+    '"': '"',
+    "?": "?",
+    "\n": "",
+}
+
+
+def unescape_cxx(body):
+    def replace(match):
+        octal, hexa, ucn4, ucn8, simple = match.groups()
+        if simple is not None:
+            if simple not in cxx_simple_escapes:
+                raise LiteralError(f"unknown escape sequence '\\{simple}'")
+            return cxx_simple_escapes[simple]
+        code = int(octal, 8) if octal is not None else int(hexa or ucn4 or ucn8, 16)
+        if code > 0x10FFFF:
+            raise LiteralError("escape sequence out of range")
+        return chr(code)
+
+    return cxx_escape_pattern.sub(replace, body)
+
+
+def tokenize_cxx(text, pos, end):
+    """Yield (kind, value, end position) for the tokens of text[pos:end].
+
+    String literals (including raw strings and encoding prefixes) are decoded;
+    whitespace and comments are skipped."""
+    while pos < end:
+        match = cxx_token_pattern.match(text, pos, end)
+        kind = match.lastgroup
+        if kind == "delim":
+            kind = "raw"
+        if kind == "raw":
+            terminator = ")" + match.group("delim") + '"'
+            close = text.find(terminator, match.end(), end)
+            if close == -1:
+                raise LiteralError("unterminated raw string literal")
+            yield "string", text[match.end() : close], close + len(terminator)
+            pos = close + len(terminator)
+            continue
+        pos = match.end()
+        if kind == "body":
+            kind = "string"
+        if kind == "string":
+            # Line splices are removed before escapes are decoded.
+            yield "string", unescape_cxx(match.group("body")), pos
+        elif kind == "other" and match.group() == '"':
+            raise LiteralError("unterminated string literal")
+        elif kind not in ("space", "comment"):
+            yield kind, match.group(), pos
+
+
+def find_call_end(text, pos):
+    """Return the position of the parenthesis closing the first group opened
+    at or after `pos`, skipping parentheses inside literals and comments."""
+    depth = 0
+    while pos < len(text):
+        match = cxx_token_pattern.match(text, pos)
+        kind = match.lastgroup
+        if kind in ("raw", "delim"):
+            close = text.find(")" + match.group("delim") + '"', match.end())
+            if close == -1:
+                break
+            pos = close + len(match.group("delim")) + 2
+            continue
+        if kind == "other":
+            ch = match.group()
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+                if depth == 0:
+                    return pos
+        pos = match.end()
+    return len(text) - 1
+
+
+def parse_string_literals(text, pos, end, suffix, trailing):
+    """Concatenate a group of adjacent string literals in text[pos:end].
+
+    The first group is returned, or the last one if `suffix` is set. The
+    first group must end at an argument separator or a closing parenthesis
+    (or the end of the range). Unless `trailing` is set, the last group must
+    also end the range. Raises LiteralError if no such group exists."""
+    groups = []
+    in_group = False
+    trailing_tokens = False
+    for kind, value, _ in tokenize_cxx(text, pos, end):
+        if kind == "string":
+            if not in_group:
+                groups.append([])
+                in_group = True
+            groups[-1].append(value)
+            trailing_tokens = False
+        else:
+            if len(groups) == 0:
+                raise LiteralError("argument does not start with a string literal")
+            if not suffix:
+                if value not in (",", ")"):
+                    raise LiteralError("argument is not a string literal")
+                break
+            in_group = False
+            trailing_tokens = True
+    if len(groups) == 0:
+        raise LiteralError("no string literal found")
+    if not suffix:
+        return "".join(groups[0])
+    if trailing_tokens and not trailing:
+        raise LiteralError("argument does not end with a string literal")
+    return "".join(groups[-1])
+
+
+def find_literal_start(text, beg):
+    """Move `beg` back over the encoding prefix of the literal at `beg`."""
+    for prefix in ["u8R", "uR", "UR", "LR", "u8", "R", "u", "U", "L"]:
+        start = beg - len(prefix)
+        if (
+            start >= 0
+            and text.startswith(prefix, start)
+            and (
+                start == 0 or not (text[start - 1].isalnum() or text[start - 1] == "_")
+            )
+        ):
+            return start
+    return beg
+
+
+def extract_message(srcstr, pos, extractor):
+    """Extract the string argument of the keyword found at `pos`.
+
+    Returns the extracted string (or None), an error message if the argument
+    could not be parsed, and the position where the scan for the next
+    occurrence of the same keyword should resume."""
+    beg = srcstr.find('"', pos)
+    if beg == -1:
+        return None, None, len(srcstr)
+    end = find_call_end(srcstr, pos)
+    if extractor.line:
+        line_end = srcstr.find("\n", pos)
+        end = min(end, line_end if line_end != -1 else len(srcstr))
+    beg = find_literal_start(srcstr, beg)
+    if beg >= end:
+        return None, None, end
+    try:
+        substr = parse_string_literals(
+            srcstr, beg, end, extractor.suffix, extractor.trunc_for_suffix
+        )
+    except LiteralError as e:
+        return None, str(e), end
+    while substr.startswith("(") and substr.endswith(")"):
+        substr = substr[1:-1]
+    if (
+        len(substr) != 0
+        and not (("-" in substr) and (" " not in substr) and ("<" not in substr))
+        and len(substr) < extractor.max_len
+    ):
+        return substr, None, end
+    return None, None, end
+
+
+def self_test():
+    """Extract the arguments of built-in calls and compare them with the
+    expected strings (None for a failure). Return the number of mismatches."""
+    desc = Extractor("", "", "cl::desc(")
+    value = Extractor("", "", "clEnumValN(", suffix=True)
+    name = Extractor("", "", "_NAME ", line=True)
+    cases = [
+        (desc, 'cl::desc("a " "b")', "a b"),
+        (desc, 'cl::desc("a " /* c */ "b" // d\n)', "a b"),
+        (desc, 'cl::desc(R"x(a "(b)" c)x")', 'a "(b)" c'),
+        (desc, 'cl::desc(u8"a\\x41\\101\\u00e9")', "aAA\u00e9"),
+        (desc, 'cl::desc("a " FOO " b")', None),
+        (desc, 'cl::desc("a" + B)', None),
+        (desc, 'cl::desc("a\\q")', None),
+        (desc, 'cl::desc("a), cl::init(1)', None),
+        (value, 'clEnumValN(A, "a", "b " "c")', "b c"),
+        (value, 'clEnumValN(A, "a", "b" C)', None),
+        (name, '#define PASS_NAME "a" // b\nf("c");', "a"),
+        (name, '#define PASS_NAME "a" B\nf("c");', None),
+    ]
+    failures = 0
+    for extractor, text, expected in cases:
+        actual, reason, _ = extract_message(text, 0, extractor)
+        if actual != expected:
+            print(f"Mismatch: {text!r}: {actual!r} ({reason}), expected {expected!r}")
+            failures += 1
+    return failures
+
+
+keyword_patterns = dict()
+
+
+def get_keyword_pattern(keywords):
+    # A lookahead is used so that overlapping occurrences of different
+    # keywords are all reported.
+    if keywords not in keyword_patterns:
+        alternatives = sorted(keywords, key=len, reverse=True)
+        keyword_patterns[keywords] = re.compile(
+            "(?=(" + "|".join(map(re.escape, alternatives)) + "))"
+        )
+    return keyword_patterns[keywords]
+
+
+def scan_source(srcstr, active):
+    """Find all keywords of the active extractors in a single pass.
+
+    Returns the extracted strings and the arguments that could not be parsed,
+    as (extractor, line, reason) tuples."""
+    results = []
+    failures = []
+    by_keyword = dict()
+    for idx in active:
+        by_keyword.setdefault(extractors[idx].keyword, []).append(idx)
+    pattern = get_keyword_pattern(tuple(sorted(by_keyword)))
+    # Each extractor resumes after the end of its previous match, like a
+    # repeated str.find would.
+    resume = {idx: 0 for idx in active}
+    for match in pattern.finditer(srcstr):
+        pos = match.start()
+        for idx in by_keyword[match.group(1)]:
+            if pos <= resume[idx]:
+                continue
+            substr, error, resume[idx] = extract_message(srcstr, pos, extractors[idx])
+            if substr is not None:
+                results.append((idx, substr))
+            if error is not None:
+                failures.append((idx, srcstr.count("\n", 0, pos) + 1, error))
+    return results, failures
+
+
+def is_source_file(filename):
+    return (
+        filename.endswith(".cpp")
+        or filename.endswith(".h")
+        or (filename.startswith("__") and "." not in filename)
+    )
+
+
+def get_active_extractors(src_path, root):
+    rel = os.path.normpath(os.path.relpath(root, src_path))
+    active = []
+    for idx, extractor in enumerate(extractors):
+        path = os.path.normpath(extractor.path)
+        if path == "." or rel == path or rel.startswith(path + os.sep):
+            active.append(idx)
+    return tuple(active)
+
+
+def collect_source_files(src_path):
+    files = []
+    for r, ds, fs in os.walk(src_path):
+        ds.sort()
+        if "test" in r:
+            continue
+        active = get_active_extractors(src_path, r)
+        if len(active) == 0:
+            continue
+        for f in sorted(fs):
+            if is_source_file(f):
+                files.append((os.path.join(r, f), active))
+    return files
+
+
+def hash_file(path):
+    with open(path, "rb") as src:
+        return hashlib.sha1(src.read()).hexdigest()
+
+
+def scan_file(task):
+    path, active = task
+    with open(path) as src:
+        srcstr = src.read()
+    results, failures = scan_source(srcstr, active)
+    return [[list(item) for item in results], [list(item) for item in failures]]
+
+
+def get_custom_messages(trees, jobs, cache):
+    """Walk each source tree once, reading each file once for all extractors.
+
+    Files whose path, mtime and size match the cache index reuse their
+    recorded content digest; the others are hashed again. Each distinct
+    content is scanned only once, even if it appears in several trees, by
+    `jobs` worker processes. Results are merged in walk order, so the output
+    does not depend on the number of workers or on the cache state.
+
+    Returns the extracted strings as (tree, relative path, extractor, string)
+    tuples and the arguments that could not be parsed, as (path, line,
+    extractor, reason) tuples."""
+    files = []
+    for name, src_path in trees:
+        for path, active in collect_source_files(src_path):
+            files.append((name, path, os.path.relpath(path, src_path), active))
+    file_index = cache["files"]
+    contents = cache["contents"]
+    new_file_index = {name: dict() for name, _ in trees}
+    to_hash = []
+    for name, path, rel, active in files:
+        st = os.stat(path)
+        entry = file_index.get(name, {}).get(rel)
+        if (
+            entry is None
+            or entry["mtime"] != st.st_mtime_ns
+            or entry["size"] != st.st_size
+        ):
+            entry = {"mtime": st.st_mtime_ns, "size": st.st_size, "digest": None}
+            to_hash.append((entry, path))
+        new_file_index[name][rel] = entry
+
+    with Pool(processes=jobs) if jobs > 1 else nullcontext() as pool:
+        mapper = partial(pool.map, chunksize=64) if jobs > 1 else map
+        hashed = mapper(hash_file, [path for _, path in to_hash])
+        for (entry, _), digest in zip(to_hash, hashed):
+            entry["digest"] = digest
+
+        keys = []
+        pending = dict()
+        for name, path, rel, active in files:
+            digest = new_file_index[name][rel]["digest"]
+            key = digest + "/" + ",".join(map(str, active))
+            keys.append(key)
+            if key not in contents and key not in pending:
+                pending[key] = (path, active)
+        print("Scanning:", len(pending), "of", len(files), "files")
+        for key, res in zip(pending, mapper(scan_file, list(pending.values()))):
+            contents[key] = res
+
+    results = []
+    failures = []
+    for (name, path, rel, active), key in zip(files, keys):
+        res, errors = contents[key]
+        for extractor_idx, substr in res:
+            results.append((name, rel, extractor_idx, substr))
+        for extractor_idx, line, reason in errors:
+            failures.append((path, line, extractor_idx, reason))
+
+    # Drop deleted files and contents no longer referenced by any file.
+    live = set(keys)
+    cache["files"] = new_file_index
+    cache["contents"] = {k: v for k, v in contents.items() if k in live}
+    return results, failures
+
+
+def preprocess(llvm_build_path, extractor, cache):
+    include_path = os.path.join(llvm_build_path, "tools/clang/include")
+    key = hashlib.sha1(extractor.encode())
+    for header in re.findall(r'#include "(.*)"', extractor):
+        try:
+            with open(os.path.join(include_path, header), "rb") as f:
+                key.update(hashlib.sha1(f.read()).digest())
+        except FileNotFoundError:
+            key.update(b"missing")
+    key = key.hexdigest()
+    if key in cache["prev_preprocessed"]:
+        cache["preprocessed"][key] = cache["prev_preprocessed"][key]
+    else:
+        cache["preprocessed"][key] = (
+            subprocess.check_output(
+                ["cc", "-E", "-P", "-I", include_path, "-"],
+                input=extractor.encode(),
+            )
+            .decode()
+            .splitlines()
+        )
+    return cache["preprocessed"][key]
+
+
+def load_cache(path):
+    """Load the incremental collection cache.
+
+    The cache is discarded when the extractor definitions have changed."""
+    signature = hashlib.sha1(
+        (str(CACHE_VERSION) + repr(extractors)).encode()
+    ).hexdigest()
+    cache = None
+    if path is not None and os.path.exists(path):
+        with open(path) as f:
+            cache = json.load(f)
+        if cache.get("signature") != signature:
+            cache = None
+    if cache is None:
+        cache = {"signature": signature, "files": {}, "contents": {}}
+    # Outputs of the previous run are kept only if they are used again.
+    cache["prev_preprocessed"] = cache.get("preprocessed", {})
+    cache["preprocessed"] = dict()
+    return cache
+
+
+def save_cache(path, cache):
+    cache.pop("prev_preprocessed")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def parse_option_string(line):
+    if '"' not in line:
+        return None
+    res = None
+    try:
+        res = ast.literal_eval(line)
+    except Exception:
+        pass
+    if res is None:
+        pos1 = line.find('"')
+        pos2 = line.rfind('"')
+        if pos1 != -1 and pos2 != -1:
+            res = ast.literal_eval(line[pos1 : pos2 + 1])
+    if len(res) != 0:
+        return res
+    return None
+
+
+special_strings = [
+    "clang LLVM compiler",
+    "OVERVIEW: ",
+    "USAGE: ",
+    "OPTIONS:\n",
+    "SUBCOMMANDS:\n\n",
+    '  Type "',
+    ' <subcommand> --help" to get more help on a specific ' "subcommand",
+    " [options]",
+    "SUBCOMMAND '",
+    " [subcommand]",
+    "= *cannot print option value*\n",
+    "*no default*",
+    " (default: ",
+    "= *unknown option value*\n",
+    "PLEASE submit a bug report to https://github.com/llvm/llvm-project/issues/ and include the crash backtrace, preprocessed source, and associated run script.\n",
+    "PLEASE submit a bug report to https://github.com/llvm/llvm-project/issues/ and include the crash backtrace.\n",
     "WARNING: You're attempting to print out a bitcode file.\n"
     "This is inadvisable as it may cause display problems. If\n"
     "you REALLY want to taste LLVM bitcode first-hand, you\n"
-    "can force output with the `-f' option.\n\n"
-)
-strings.append(
+    "can force output with the `-f' option.\n\n",
     "\n********************\n\n"
     "PLEASE ATTACH THE FOLLOWING FILES TO THE BUG REPORT:\n"
-    "Preprocessed source(s) and associated run script(s) are located at:"
-)
-strings.append("Override the behaviour of expand-variadics")
-strings.append(
-    "Options: <empty>|Legal|Discard|Convert. If non-empty, ignore TargetTransformInfo and always use this transformation for the %evl parameter (Used in testing)."
-)
-strings.append(": Unknown ")
-strings.append("command line argument")
-strings.append("subcommand")
-strings.append("'.  Try: '")
-strings.append(": Did you mean '")
-strings.append(
+    "Preprocessed source(s) and associated run script(s) are located at:",
+    "Override the behaviour of expand-variadics",
+    "Options: <empty>|Legal|Discard|Convert. If non-empty, ignore TargetTransformInfo and always use this transformation for the %evl parameter (Used in testing).",
+    ": Unknown ",
+    "command line argument",
+    "subcommand",
+    "'.  Try: '",
+    ": Did you mean '",
     "This argument does not take a value.\n"
     "\tInstead, it consumes any positional arguments until "
-    "the next recognized option."
-)
-strings.append(": Not enough positional command line arguments specified!\n")
-strings.append("Must specify at least ")
-strings.append(" positional argument")
-strings.append(": See: ")
-strings.append(": Too many positional arguments specified!\n")
-strings.append("Can specify at most ")
-strings.append(" positional arguments: See: ")
-strings.append("must be specified at least once!")
-strings.append("invalid case style for %0 '%1'")
-strings.append(
+    "the next recognized option.",
+    ": Not enough positional command line arguments specified!\n",
+    "Must specify at least ",
+    " positional argument",
+    ": See: ",
+    ": Too many positional arguments specified!\n",
+    "Can specify at most ",
+    " positional arguments: See: ",
+    "must be specified at least once!",
+    "invalid case style for %0 '%1'",
     "declaration uses identifier '%0', which is %select{a reserved "
-    "identifier|not a reserved identifier|reserved in the global namespace}1"
-)
+    "identifier|not a reserved identifier|reserved in the global namespace}1",
+]
 
-strings = list(set(filter(lambda x: x.lower() != x.upper(), strings)))
 block_words = [
     "All",
     "all",
@@ -305,8 +623,255 @@ block_words = [
     " version ",
     "' attribute: ",
 ]
-strings = sorted(filter(lambda x: x not in block_words, strings))
 
-with open(output_path, "w") as f:
-    for line in strings:
-        f.write(repr(line) + "\n")
+
+def write_delta(path, previous, strings):
+    """Write the strings added to and removed from the previous corpus."""
+    previous_set = set(previous)
+    current_set = set(strings)
+    delta = {
+        "added": [
+            {"hash": compute_hash(s), "string": s}
+            for s in strings
+            if s not in previous_set
+        ],
+        "removed": [
+            {"hash": compute_hash(s), "string": s}
+            for s in previous
+            if s not in current_set
+        ],
+    }
+    print("Added:", len(delta["added"]))
+    print("Removed:", len(delta["removed"]))
+    with open(path, "w") as f:
+        json.dump(delta, f, indent=2, ensure_ascii=False)
+
+
+def detect_llvm_version(src_path):
+    for cmake_file in ["cmake/Modules/LLVMVersion.cmake", "llvm/CMakeLists.txt"]:
+        try:
+            with open(os.path.join(src_path, cmake_file)) as f:
+                match = re.search(r"set\(LLVM_VERSION_MAJOR (\d+)\)", f.read())
+        except FileNotFoundError:
+            continue
+        if match:
+            return match.group(1)
+    return "default"
+
+
+def collect_tree(name, build_path, custom_messages, cache):
+    """Return the provenance records of the strings found in one tree."""
+    records = []
+    diagnostic_strings = preprocess(build_path, diagnostic_extractor, cache)
+    for line in diagnostic_strings:
+        if line.startswith("CLANG_I18N_SOURCE "):
+            source = ast.literal_eval(line.removeprefix("CLANG_I18N_SOURCE "))
+            continue
+        enum, category, desc = line.split(" ", 2)
+        records.append(
+            (ast.literal_eval(desc), "diagnostic", source, enum, category, name)
+        )
+    print("Diagnostic:", len(records))
+
+    counts = dict()
+    for extractor in extractors:
+        counts[extractor.group] = 0
+    for tree, path, idx, substr in custom_messages:
+        if tree != name:
+            continue
+        group = extractors[idx].group
+        kind = group.lower().replace(" ", "_")
+        records.append((substr, kind, path, None, None, name))
+        counts[group] += 1
+    print("Custom Diagnostic:", counts["Custom Diagnostic"])
+
+    option_strings = preprocess(build_path, option_extractor, cache)
+    print("Option:", len(option_strings))
+    for line in option_strings:
+        res = parse_option_string(line)
+        if res is not None:
+            records.append(
+                (res, "option", "clang/Driver/Options.inc", None, None, name)
+            )
+    for group in [
+        "Inline Option",
+        "Old Passes",
+        "Program Desc",
+        "Schedulers",
+        "Debug Counter",
+        "Register Allocators",
+    ]:
+        print(group + ":", counts[group])
+
+    for strval in special_strings:
+        records.append((strval, "special", None, None, None, name))
+    return records
+
+
+def write_index(path, strings, records):
+    """Write the provenance of the corpus strings to an SQLite database.
+
+    `strings` holds one row per corpus string, `sources` one row per
+    distinct (kind, file, diagnostic) the string was extracted from and
+    `versions` one row per source tree that contains the string."""
+    corpus = set(strings)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    db.executescript("""
+        CREATE TABLE strings (hash TEXT PRIMARY KEY, string TEXT NOT NULL);
+        CREATE TABLE sources (
+            hash TEXT NOT NULL REFERENCES strings(hash),
+            kind TEXT NOT NULL,
+            file TEXT,
+            diag_enum TEXT,
+            diag_category TEXT
+        );
+        CREATE TABLE versions (
+            hash TEXT NOT NULL REFERENCES strings(hash),
+            version TEXT NOT NULL,
+            PRIMARY KEY (hash, version)
+        );
+        """)
+    db.executemany(
+        "INSERT INTO strings VALUES (?, ?)",
+        [(compute_hash(s), s) for s in strings],
+    )
+    sources = set()
+    versions = set()
+    for strval, kind, file, diag_enum, diag_category, version in records:
+        if strval in corpus:
+            hashval = compute_hash(strval)
+            sources.add((hashval, kind, file, diag_enum, diag_category))
+            versions.add((hashval, version))
+    db.executemany(
+        "INSERT INTO sources VALUES (?, ?, ?, ?, ?)",
+        sorted(sources, key=lambda x: tuple(v or "" for v in x)),
+    )
+    db.executemany("INSERT INTO versions VALUES (?, ?)", sorted(versions))
+    db.executescript("""
+        CREATE INDEX sources_hash ON sources (hash);
+        CREATE INDEX sources_kind ON sources (kind, file);
+        """)
+    db.commit()
+    db.close()
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Collect translatable strings from an LLVM checkout"
+    )
+    parser.add_argument(
+        "llvm_src_path", nargs="?", help="Path to the llvm-project sources"
+    )
+    parser.add_argument(
+        "llvm_build_path", nargs="?", help="Path to the LLVM build directory"
+    )
+    parser.add_argument("output_path", nargs="?", help="Path to the output corpus file")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to scan source files",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Report every argument that could not be parsed",
+    )
+    parser.add_argument(
+        "--cache",
+        help="Path to the incremental collection cache. Only files changed "
+        "since the previous run are scanned again",
+    )
+    parser.add_argument(
+        "--previous",
+        help="Path to the previous corpus. The added and removed strings are "
+        "written to the delta file",
+    )
+    parser.add_argument(
+        "--delta",
+        help="Path to the delta file (default: <output_path>.delta.json)",
+    )
+    parser.add_argument(
+        "--name",
+        help="Version tag of the source tree given by llvm_src_path "
+        "(default: the LLVM major version)",
+    )
+    parser.add_argument(
+        "--tree",
+        nargs=3,
+        action="append",
+        default=[],
+        metavar=("NAME", "SRC", "BUILD"),
+        help="Collect strings from an additional source/build tree as well. "
+        "The corpus is the union of all trees",
+    )
+    parser.add_argument(
+        "--index",
+        help="Path to an SQLite database recording the hash, kind and source "
+        "of every collected string",
+    )
+    parser.add_argument(
+        "--self-test",
+        action="store_true",
+        help="Parse the string arguments of built-in calls and exit",
+    )
+    args = parser.parse_args()
+
+    if args.self_test:
+        failures = self_test()
+        print("Self-test:", "failed" if failures else "passed")
+        sys.exit(1 if failures else 0)
+    if args.output_path is None:
+        parser.error("the source, build and output paths are required")
+
+    name = args.name or detect_llvm_version(args.llvm_src_path)
+    trees = [(name, args.llvm_src_path, args.llvm_build_path)]
+    trees += [tuple(tree) for tree in args.tree]
+    if len(set(name for name, _, _ in trees)) != len(trees):
+        parser.error("tree names must be unique")
+
+    cache = load_cache(args.cache)
+    custom_messages, failures = get_custom_messages(
+        [(name, src_path) for name, src_path, _ in trees], args.jobs, cache
+    )
+    print("Unparsed:", len(failures))
+    if args.verbose:
+        for path, line, idx, reason in failures:
+            print(f"{path}:{line}: {extractors[idx].keyword}: {reason}")
+
+    # (string, kind, file, diagnostic enum, diagnostic category, tree)
+    records = []
+    for name, src_path, build_path in trees:
+        if len(trees) > 1:
+            print("Tree:", name)
+        records.extend(collect_tree(name, build_path, custom_messages, cache))
+
+    strings = set(filter(lambda x: x.lower() != x.upper(), (r[0] for r in records)))
+    strings = sorted(filter(lambda x: x not in block_words, strings))
+
+    with open(args.output_path, "w") as f:
+        for line in strings:
+            f.write(repr(line) + "\n")
+
+    if args.previous is not None:
+        write_delta(
+            args.delta or args.output_path + ".delta.json",
+            read_corpus(args.previous),
+            strings,
+        )
+
+    if args.index is not None:
+        write_index(args.index, strings, records)
+
+    if args.cache is not None:
+        save_cache(args.cache, cache)
+
+
+if __name__ == "__main__":
+    main()
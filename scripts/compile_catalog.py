@@ -0,0 +1,285 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import argparse
+import ast
+import hashlib
+import os
+import sqlite3
+import struct
+from i18n_common import compute_hash, read_corpus
+from perfect_hash import build_perfect_hash, key_of, slot_of
+from prefilter import build_prefilter, may_contain
+
+# Binary catalog layout (all integers are little-endian):
+#   header: magic, version, number of entries N, number of buckets B of the
+#           perfect hash and the offsets of the sections below, relative to
+#           the start of the file
+#   seeds: B uint32 bucket seeds of the perfect hash (see perfect_hash.py)
+#   keys: N 6-byte keys, the first 48 bits of the SHA1 of the sources,
+#         stored in the slot given by the perfect hash
+#   offsets: N + 1 uint32 offsets of the translations in the blob, in the
+#            same order as the keys
+#   blob: the unescaped UTF-8 translations, each followed by a NUL byte
+#   lengths, filter: the prefilter of the sources (see prefilter.py), empty
+#                    if the sources are unknown
+# Keep in sync with clang-i18n.cpp.
+CATALOG_MAGIC = b"CI18NCAT"
+CATALOG_VERSION = 3
+header_format = struct.Struct("<8sIIIIIIIIIIIII")
+KEY_SIZE = 6
+FILTER_HASHES = 7
+
+# Catalog shards, <lang>.<shard>.catalog, and the kinds of strings recorded by
+# collect.py they hold. Other kinds (inline_option, old_passes, ...) are
+# printed by cl::ParseCommandLineOptions and go to the cl shard. Each
+# interceptor of the plugin maps its own shard on first use, then falls back
+# to the special shard, which also holds the strings of unknown kind.
+# Keep in sync with clang-i18n.cpp.
+SHARDS = ["diag", "options", "cl", "special"]
+shard_of_kind = {
+    "diagnostic": "diag",
+    "custom_diagnostic": "diag",
+    "option": "options",
+    "special": "special",
+}
+
+
+def align(offset, alignment=4):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def read_translation(path):
+    """Return the translations of a .yml file, keyed by hash. Later entries
+    override earlier ones, as in the plugin."""
+    translation = dict()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("H"):
+                translation[line[:13]] = ast.literal_eval(line[15:])
+    return translation
+
+
+def read_sources(path):
+    """Return the sources of the entries of a .yml file, taken from the
+    comment lines, keyed by hash. Comments that do not match the hash of the
+    following entry are ignored."""
+    sources = dict()
+    src = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("# "):
+                try:
+                    src = ast.literal_eval(line[2:])
+                except (SyntaxError, ValueError):
+                    src = None
+            elif line.startswith("H"):
+                if isinstance(src, str) and compute_hash(src) == line[:13]:
+                    sources[line[:13]] = src
+                src = None
+    return sources
+
+
+def read_shards(path):
+    """Return the shards of the strings recorded in an index written by
+    collect.py --index, keyed by hash."""
+    shards = dict()
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    for hashval, kind in db.execute("SELECT DISTINCT hash, kind FROM sources"):
+        shards.setdefault(hashval, set()).add(shard_of_kind.get(kind, "cl"))
+    db.close()
+    return shards
+
+
+def split_translation(translation, shards):
+    """Split a {hash: translation} map into one map per shard. Strings of
+    several kinds are stored in each of their shards."""
+    res = {name: dict() for name in SHARDS}
+    for key, value in translation.items():
+        for name in shards.get(key, ["special"]):
+            res[name][key] = value
+    return res
+
+
+def write_catalog(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_catalog(translation, sources=None):
+    """Serialize a {hash: translation} map into a binary catalog. The
+    prefilter is built if `sources` maps every hash to its source."""
+    items = list(translation.items())
+    seeds, order = build_perfect_hash([int(key[1:], 16) for key, _ in items])
+    entries = [items[idx] for idx in order]
+    keys = b"".join(bytes.fromhex(key[1:]) for key, _ in entries)
+    offsets = []
+    blob = bytearray()
+    for _, value in entries:
+        offsets.append(len(blob))
+        blob += value.encode("utf-8") + b"\0"
+    offsets.append(len(blob))
+    lengths, bloom, bits = b"", b"", 0
+    if sources is not None and all(key in sources for key in translation):
+        lengths, bloom, bits = build_prefilter(
+            [sources[key].encode("utf-8") for key in translation],
+            hashes=FILTER_HASHES,
+        )
+
+    seeds_offset = header_format.size
+    keys_offset = seeds_offset + 4 * len(seeds)
+    offsets_offset = align(keys_offset + len(keys))
+    blob_offset = offsets_offset + 4 * len(offsets)
+    lengths_offset = blob_offset + len(blob)
+    filter_offset = lengths_offset + len(lengths)
+    data = bytearray(filter_offset + len(bloom))
+    header_format.pack_into(
+        data,
+        0,
+        CATALOG_MAGIC,
+        CATALOG_VERSION,
+        len(entries),
+        len(seeds),
+        seeds_offset,
+        keys_offset,
+        offsets_offset,
+        blob_offset,
+        len(blob),
+        lengths_offset,
+        len(lengths),
+        filter_offset,
+        bits,
+        FILTER_HASHES,
+    )
+    struct.pack_into(f"<{len(seeds)}I", data, seeds_offset, *seeds)
+    data[keys_offset : keys_offset + len(keys)] = keys
+    struct.pack_into(f"<{len(offsets)}I", data, offsets_offset, *offsets)
+    data[blob_offset:lengths_offset] = blob
+    data[lengths_offset:filter_offset] = lengths
+    data[filter_offset:] = bloom
+    return bytes(data)
+
+
+class Catalog:
+    """Reference implementation of the lookup of the plugin."""
+
+    def __init__(self, data):
+        (
+            magic,
+            version,
+            self.size,
+            num_buckets,
+            seeds_offset,
+            self.keys_offset,
+            self.offsets_offset,
+            self.blob_offset,
+            blob_size,
+            lengths_offset,
+            lengths_size,
+            filter_offset,
+            self.filter_bits,
+            self.filter_hashes,
+        ) = header_format.unpack_from(data)
+        if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+            raise ValueError("not a translation catalog of the current version")
+        self.data = data
+        self.seeds = struct.unpack_from(f"<{num_buckets}I", data, seeds_offset)
+        self.lengths = data[lengths_offset : lengths_offset + lengths_size]
+        self.bloom = data[filter_offset : filter_offset + self.filter_bits // 8]
+
+    def may_contain(self, strval):
+        """Return False if the prefilter rejects a source string."""
+        if len(self.lengths) == 0:
+            return True
+        return may_contain(
+            strval.encode("utf-8"),
+            self.lengths,
+            self.bloom,
+            self.filter_bits,
+            self.filter_hashes,
+        )
+
+    def lookup_key(self, key):
+        """Return the translation of a 6-byte key, or None."""
+        if self.size == 0:
+            return None
+        slot = slot_of(key_of(key), self.seeds, self.size)
+        pos = self.keys_offset + slot * KEY_SIZE
+        if self.data[pos : pos + KEY_SIZE] != key:
+            return None
+        begin, end = struct.unpack_from(
+            "<II", self.data, self.offsets_offset + 4 * slot
+        )
+        return self.data[self.blob_offset + begin : self.blob_offset + end - 1].decode(
+            "utf-8"
+        )
+
+    def lookup(self, strval):
+        """Return the translation of a source string, or None."""
+        if not self.may_contain(strval):
+            return None
+        return self.lookup_key(hashlib.sha1(strval.encode("utf-8")).digest()[:KEY_SIZE])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile translation files into binary catalogs"
+    )
+    parser.add_argument("translations", nargs="+", help="Translation files (.yml)")
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        help="Directory of the catalogs (default: next to each translation file)",
+    )
+    parser.add_argument(
+        "--corpus",
+        help="Corpus providing the sources of the entries without a valid "
+        "comment line, needed for the prefilter",
+    )
+    parser.add_argument(
+        "--index",
+        help="SQLite index written by collect.py --index. If given, each "
+        "translation file is split into one catalog per shard of string kinds",
+    )
+    args = parser.parse_args()
+
+    corpus_map = dict()
+    if args.corpus is not None:
+        for strval in read_corpus(args.corpus):
+            corpus_map[compute_hash(strval)] = strval
+    shards = read_shards(args.index) if args.index is not None else None
+    for path in args.translations:
+        translation = read_translation(path)
+        sources = dict(corpus_map)
+        sources.update(read_sources(path))
+        stem = os.path.join(
+            args.output_dir or os.path.dirname(path),
+            os.path.splitext(os.path.basename(path))[0],
+        )
+        # The plugin prefers <lang>.catalog, so the other layout is removed.
+        if shards is None:
+            outputs = {stem + ".catalog": translation}
+            stale = [f"{stem}.{name}.catalog" for name in SHARDS]
+        else:
+            outputs = {
+                f"{stem}.{name}.catalog": entries
+                for name, entries in split_translation(translation, shards).items()
+            }
+            stale = [stem + ".catalog"]
+        for output, entries in outputs.items():
+            data = build_catalog(entries, sources)
+            if len(entries) != 0 and Catalog(data).filter_bits == 0:
+                print(f"{output}: unknown sources, the prefilter is not built")
+            write_catalog(output, data)
+            print(f"{output}: {len(entries)} entries, {len(data)} bytes")
+        for output in stale:
+            if os.path.exists(output):
+                os.remove(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import ast
+import hashlib
+
+
+def compute_hash(strval: str):
+    return "H" + hashlib.sha1(strval.encode("utf-8")).digest().hex()[:12].upper()
+
+
+def read_corpus(path):
+    """Return the strings of a corpus file, in file order."""
+    with open(path) as f:
+        return [ast.literal_eval(line) for line in f.read().splitlines()]
+
+
+def build_batch_prompt(prompt, literals):
+    """Append to `prompt` the code block of `messageN = <literal>` lines
+    that the model is asked to translate."""
+    res = prompt + "\n```python\n"
+    for idx, literal in enumerate(literals):
+        res += f"message{idx} = {literal}\n"
+    return res + "```\n"
@@ -0,0 +1,226 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import json
+import os
+import time
+from collections import Counter
+
+
+def approx_tokens(text):
+    # Most tokenizers produce about one token per three bytes of text.
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted `values`."""
+    if len(values) == 0:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Throughput, latency and failure statistics of a translation run.
+
+    Every finished request is passed to record(). A summary line is printed
+    every `interval` seconds (0: never) and, if `prometheus_path` is set, a
+    Prometheus textfile is rewritten at the same time. Request retries and
+    cache hits are read from `engine` and `cache` when they are attached."""
+
+    def __init__(self, interval=60, prometheus_path=None):
+        self.interval = interval
+        self.prometheus_path = prometheus_path
+        self.engine = None
+        self.cache = None
+        self.start = time.monotonic()
+        self.last_report = self.start
+        self.requests = 0
+        self.strings = 0
+        self.accepted = 0
+        self.prompt_tokens = 0
+        self.reply_tokens = 0
+        self.latencies = []
+        self.reasons = Counter()
+        # Batch size -> counters
+        self.by_size = dict()
+        # Locale -> counters
+        self.by_locale = dict()
+
+    def record(self, batch_size, accepted, reasons, latency, prompt, reply, locale=""):
+        """Record a finished request. `reasons` counts the rejected strings of
+        the batch by failure reason."""
+        self.requests += 1
+        self.strings += batch_size
+        self.accepted += accepted
+        self.prompt_tokens += approx_tokens(prompt)
+        self.reply_tokens += approx_tokens(reply) if len(reply) != 0 else 0
+        self.latencies.append(latency)
+        self.reasons.update(reasons)
+        for group, key in [(self.by_size, batch_size), (self.by_locale, locale)]:
+            counters = group.setdefault(key, Counter())
+            counters["requests"] += 1
+            counters["strings"] += batch_size
+            counters["accepted"] += accepted
+            counters["latency"] += latency
+        if self.interval > 0 and time.monotonic() - self.last_report >= self.interval:
+            self.last_report = time.monotonic()
+            print(self.summary(), flush=True)
+            if self.prometheus_path is not None:
+                self.write_prometheus(self.prometheus_path)
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        latencies = sorted(self.latencies)
+        line = (
+            f"[metrics] {self.accepted}/{self.strings} strings accepted, "
+            f"{self.accepted / elapsed:.2f} strings/s, "
+            f"{(self.prompt_tokens + self.reply_tokens) / elapsed:.0f} tokens/s, "
+            f"latency p50 {percentile(latencies, 0.5):.1f}s "
+            f"p90 {percentile(latencies, 0.9):.1f}s "
+            f"p99 {percentile(latencies, 0.99):.1f}s"
+        )
+        if self.engine is not None:
+            line += f", retries {self.engine.retries}"
+        if len(self.reasons) != 0:
+            reason, count = self.reasons.most_common(1)[0]
+            line += f", top failure {reason!r} x{count}"
+        return line
+
+    def report(self):
+        elapsed = time.monotonic() - self.start
+        latencies = sorted(self.latencies)
+        res = {
+            "elapsed": elapsed,
+            "requests": self.requests,
+            "strings": self.strings,
+            "accepted": self.accepted,
+            "strings_per_second": self.accepted / elapsed if elapsed > 0 else 0.0,
+            "estimated_prompt_tokens": self.prompt_tokens,
+            "estimated_reply_tokens": self.reply_tokens,
+            "latency": {
+                "p50": percentile(latencies, 0.5),
+                "p90": percentile(latencies, 0.9),
+                "p99": percentile(latencies, 0.99),
+                "max": latencies[-1] if len(latencies) != 0 else 0.0,
+            },
+            "failures": dict(self.reasons.most_common()),
+            "by_batch_size": {
+                str(size): dict(counters)
+                for size, counters in sorted(self.by_size.items())
+            },
+        }
+        if len(self.by_locale) > 1 or "" not in self.by_locale:
+            res["by_locale"] = {
+                locale: dict(counters)
+                for locale, counters in sorted(self.by_locale.items())
+            }
+        if self.engine is not None:
+            res["retries"] = self.engine.retries
+            res["failed_requests"] = self.engine.failures
+        if self.cache is not None:
+            res["cache_hits"] = self.cache.hits
+            res["cache_misses"] = self.cache.misses
+        return res
+
+    def write_json(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def write_prometheus(self, path):
+        """Write the counters in the Prometheus text format, e.g. for the
+        textfile collector of node_exporter."""
+        prefix = "clang_i18n_translate"
+        lines = []
+
+        def metric(name, kind, doc, samples):
+            lines.append(f"# HELP {prefix}_{name} {doc}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(
+                    f'{k}="{escape_label(str(v))}"' for k, v in labels.items()
+                )
+                if len(label_str) != 0:
+                    label_str = "{" + label_str + "}"
+                lines.append(f"{prefix}_{name}{label_str} {value}")
+
+        metric("requests_total", "counter", "Finished requests.", [({}, self.requests)])
+        metric(
+            "strings_total",
+            "counter",
+            "Strings sent, by result.",
+            [
+                ({"result": "sent"}, self.strings),
+                ({"result": "accepted"}, self.accepted),
+            ],
+        )
+        metric(
+            "estimated_tokens_total",
+            "counter",
+            "Estimated tokens, by direction.",
+            [
+                ({"direction": "prompt"}, self.prompt_tokens),
+                ({"direction": "reply"}, self.reply_tokens),
+            ],
+        )
+        metric(
+            "rejected_strings_total",
+            "counter",
+            "Rejected strings, by reason.",
+            [({"reason": r}, c) for r, c in sorted(self.reasons.items())],
+        )
+        latencies = sorted(self.latencies)
+        metric(
+            "request_latency_seconds",
+            "summary",
+            "Request latency.",
+            [({"quantile": q}, percentile(latencies, q)) for q in [0.5, 0.9, 0.99]],
+        )
+        lines.append(f"{prefix}_request_latency_seconds_sum {sum(latencies)}")
+        lines.append(f"{prefix}_request_latency_seconds_count {len(latencies)}")
+        for field in ["requests", "strings", "accepted"]:
+            metric(
+                f"batch_{field}_total",
+                "counter",
+                f"Counter {field}, by batch size.",
+                [
+                    ({"batch_size": size}, counters[field])
+                    for size, counters in sorted(self.by_size.items())
+                ],
+            )
+        if self.engine is not None:
+            metric(
+                "retries_total",
+                "counter",
+                "Retried requests.",
+                [({}, self.engine.retries)],
+            )
+        if self.cache is not None:
+            metric(
+                "cache_lookups_total",
+                "counter",
+                "Response cache lookups, by result.",
+                [
+                    ({"result": "hit"}, self.cache.hits),
+                    ({"result": "miss"}, self.cache.misses),
+                ],
+            )
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def finish(self, json_path=None):
+        print(self.summary(), flush=True)
+        if json_path is not None:
+            self.write_json(json_path)
+        if self.prometheus_path is not None:
+            self.write_prometheus(self.prometheus_path)
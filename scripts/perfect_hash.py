@@ -0,0 +1,73 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+# Minimal perfect hash of the translation catalogs, in the style of CHD
+# (compress, hash and displace): keys are hashed into buckets of `load` keys
+# on average, and each bucket gets the smallest seed that places all of its
+# keys in free slots of a table of exactly one slot per key. Biggest buckets
+# are placed first, while most slots are free.
+#
+# A key is the first 48 bits of the SHA1 of a source string, read as a
+# big-endian integer. Its slot is
+#   h = mix64(key)
+#   slot = mix64(h ^ seeds[h % len(seeds)]) % n
+# Keep in sync with clang-i18n.cpp.
+
+MASK64 = (1 << 64) - 1
+
+
+def mix64(x):
+    """The splitmix64 finalizer."""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def key_of(digest):
+    """Return the key of a SHA1 digest (or of its first 6 bytes)."""
+    return int.from_bytes(digest[:6], "big")
+
+
+def slot_of(key, seeds, n):
+    h = mix64(key)
+    return mix64(h ^ seeds[h % len(seeds)]) % n
+
+
+def build_perfect_hash(keys, load=2):
+    """Build a minimal perfect hash of distinct `keys`.
+
+    Returns (seeds, order), where order[slot] is the index in `keys` of the
+    key placed in `slot`."""
+    n = len(keys)
+    seeds = [0] * max(1, (n + load - 1) // load)
+    hashes = [mix64(key) for key in keys]
+    buckets = [[] for _ in seeds]
+    for idx, h in enumerate(hashes):
+        buckets[h % len(seeds)].append(idx)
+    order = [None] * n
+    for bucket in sorted(range(len(seeds)), key=lambda b: -len(buckets[b])):
+        members = buckets[bucket]
+        if len(members) == 0:
+            break
+        seed = 0
+        if len(members) == 1:
+            # Placed last, into a nearly full table.
+            h = hashes[members[0]]
+            while order[mix64(h ^ seed) % n] is not None:
+                seed += 1
+        while True:
+            slots = [mix64(hashes[idx] ^ seed) % n for idx in members]
+            if len(set(slots)) == len(slots) and all(
+                order[slot] is None for slot in slots
+            ):
+                break
+            seed += 1
+            if seed > 0xFFFFFFFF:
+                raise ValueError("failed to build the perfect hash")
+        seeds[bucket] = seed
+        for idx, slot in zip(members, slots):
+            order[slot] = idx
+    return seeds, order
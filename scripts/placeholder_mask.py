@@ -0,0 +1,143 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import re
+from validator import keys
+
+prompt_note = """
+Some parts of the messages are replaced by tokens such as <0>. They stand for
+placeholders and keywords that must not be translated: keep every token
+exactly once and unchanged, moving it where the grammar of the translation
+requires. Text between the tokens must be translated.
+"""
+
+head_pattern = re.compile(r"%([A-Za-z_]*)(<[^>]*>)?")
+selector_pattern = re.compile(r"[^:|{}]*:")
+index_pattern = re.compile(r"\d(,\d)?")
+keyword_pattern = re.compile(
+    r"(?<!\w)(?:"
+    + "|".join(
+        re.escape(k)
+        for k in sorted(keys, key=len, reverse=True)
+        if k[0].isalpha() or k[0] == "#"
+    )
+    + r")(?!\w)"
+)
+token_pattern = re.compile(r"<(\d+)>")
+
+
+def mask(strval):
+    """Replace the parts of a message that must not be translated with
+    opaque tokens.
+
+    Format specifiers (`%0`, `%q1`, ...), the delimiters of `%select`,
+    `%plural` (with their selectors) and `%enum_select`, whole `%sub{...}`
+    references and the keywords of validator.keys are masked; the
+    alternatives of the specifiers stay exposed. Adjacent masked parts share
+    a token. Messages using `%diff` are left as is, since translating them
+    may require swapping its argument indices.
+
+    Returns (masked, spans), where spans[i] is the text of token i."""
+    if "%diff{" in strval or token_pattern.search(strval) is not None:
+        return strval, []
+    spans = []
+    res = ""
+    # Kind of each open brace: "plural", "modifier" or None (literal brace).
+    braces = []
+
+    def add_span(text):
+        nonlocal res
+        token = f"<{len(spans) - 1}>"
+        if len(spans) != 0 and res.endswith(token):
+            spans[-1] += text
+            return
+        spans.append(text)
+        res += f"<{len(spans) - 1}>"
+
+    def index_end(pos):
+        match = index_pattern.match(strval, pos)
+        return pos if match is None else match.end()
+
+    def selector_end(pos):
+        match = selector_pattern.match(strval, pos)
+        return pos if match is None else match.end()
+
+    pos = 0
+    while pos < len(strval):
+        ch = strval[pos]
+        if ch == "%":
+            if strval.startswith("%%", pos):
+                res += "%%"
+                pos += 2
+                continue
+            head = head_pattern.match(strval, pos)
+            end = head.end()
+            if head.group(1) == "sub" and strval.startswith("{", end):
+                close = strval.find("}", end)
+                if close != -1:
+                    end = index_end(close + 1)
+                    add_span(strval[pos:end])
+                    pos = end
+                    continue
+            elif strval.startswith("{", end):
+                end += 1
+                if head.group(1) == "plural":
+                    braces.append("plural")
+                    end = selector_end(end)
+                else:
+                    braces.append("modifier")
+                add_span(strval[pos:end])
+                pos = end
+                continue
+            elif index_end(end) != end:
+                end = index_end(end)
+                add_span(strval[pos:end])
+                pos = end
+                continue
+        elif ch == "|" and len(braces) != 0 and braces[-1] is not None:
+            end = pos + 1
+            if braces[-1] == "plural":
+                end = selector_end(end)
+            add_span(strval[pos:end])
+            pos = end
+            continue
+        elif ch == "{":
+            braces.append(None)
+        elif ch == "}" and len(braces) != 0:
+            if braces.pop() is not None:
+                end = index_end(pos + 1)
+                add_span(strval[pos:end])
+                pos = end
+                continue
+        else:
+            keyword = keyword_pattern.match(strval, pos)
+            if keyword is not None:
+                add_span(keyword.group(0))
+                pos = keyword.end()
+                continue
+        res += ch
+        pos += 1
+    return res, spans
+
+
+def unmask(text, spans):
+    """Restore the masked parts of a translation. Returns None unless every
+    token occurs exactly once."""
+    used = set()
+
+    def restore(match):
+        idx = int(match.group(1))
+        if idx >= len(spans) or idx in used:
+            raise ValueError(match.group(0))
+        used.add(idx)
+        return spans[idx]
+
+    try:
+        res = token_pattern.sub(restore, text)
+    except ValueError:
+        return None
+    if len(used) != len(spans):
+        return None
+    return res
@@ -0,0 +1,63 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+# Negative-lookup prefilter of the translation catalogs. The plugin checks
+# every string against it before computing its SHA1, so most fragments of
+# unbuffered help output (padding, option names, ...) are rejected early:
+#   - a bitmap of the byte lengths of the sources, bit i set if some source
+#     has i bytes;
+#   - a Bloom filter of the sources over a power-of-two number of bits, with
+#     `hashes` probes derived from their FNV-1a 64 hash h by double hashing:
+#       bit_i = (lo32(h) + i * (hi32(h) | 1)) mod bits
+# Keep in sync with clang-i18n.cpp.
+
+MASK64 = (1 << 64) - 1
+MASK32 = (1 << 32) - 1
+FNV_OFFSET = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+
+
+def fnv1a64(data):
+    h = FNV_OFFSET
+    for byte in data:
+        h = ((h ^ byte) * FNV_PRIME) & MASK64
+    return h
+
+
+def filter_probes(data, bits, hashes):
+    h = fnv1a64(data)
+    h1 = h & MASK32
+    h2 = (h >> 32) | 1
+    return [(h1 + i * h2) & (bits - 1) for i in range(hashes)]
+
+
+def build_prefilter(sources, bits_per_key=10, hashes=7):
+    """Build the prefilter of a list of UTF-8 encoded sources.
+
+    Returns (lengths, bloom, bits), the length bitmap, the Bloom filter and
+    its number of bits."""
+    max_length = max((len(src) for src in sources), default=0)
+    lengths = bytearray(max_length // 8 + 1)
+    for src in sources:
+        lengths[len(src) // 8] |= 1 << (len(src) % 8)
+    bits = 64
+    while bits < bits_per_key * len(sources):
+        bits *= 2
+    bloom = bytearray(bits // 8)
+    for src in sources:
+        for bit in filter_probes(src, bits, hashes):
+            bloom[bit // 8] |= 1 << (bit % 8)
+    return bytes(lengths), bytes(bloom), bits
+
+
+def may_contain(data, lengths, bloom, bits, hashes):
+    """Reference implementation of the check of the plugin."""
+    if len(data) >= len(lengths) * 8:
+        return False
+    if not lengths[len(data) // 8] >> (len(data) % 8) & 1:
+        return False
+    return all(
+        bloom[bit // 8] >> (bit % 8) & 1 for bit in filter_probes(data, bits, hashes)
+    )
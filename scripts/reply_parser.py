@@ -0,0 +1,79 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import ast
+import re
+
+assignment_pattern = re.compile(r"\s*message(\d*)\s*=\s*(.*)$")
+
+
+class ReplyParser:
+    """Incremental parser of the `messageN = <literal>` lines in the first
+    code block of a reply.
+
+    Text is fed as it is streamed; `on_entry(idx, value)` is called as soon
+    as an assignment is complete, and `on_error(idx)` if its value is not a
+    literal. Values are parsed with ast.literal_eval, so nothing in the reply
+    is executed. An assignment may span several lines (e.g. triple-quoted
+    strings); a truncated one is dropped. A bare `message` variable, as used
+    by single-string requests, has index 0."""
+
+    def __init__(self, on_entry, on_error=None):
+        self.on_entry = on_entry
+        self.on_error = on_error
+        self.reset()
+
+    def reset(self):
+        """Forget the text fed so far, e.g. before a request is retried."""
+        self.buffer = ""
+        self.in_code = False
+        self.done = False
+        self.seen_code = False
+        self.pending = None
+
+    def feed(self, text):
+        self.buffer += text
+        while not self.done and "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            self.parse_line(line)
+
+    def close(self):
+        if not self.done and len(self.buffer) != 0:
+            self.parse_line(self.buffer)
+        self.buffer = ""
+        self.pending = None
+
+    def parse_line(self, line):
+        if line.lstrip().startswith("```"):
+            if self.in_code:
+                self.in_code = False
+                self.done = True
+            else:
+                self.in_code = True
+                self.seen_code = True
+            self.pending = None
+            return
+        if not self.in_code:
+            return
+        match = assignment_pattern.match(line)
+        if match is not None:
+            self.pending = (int(match.group(1) or 0), match.group(2))
+        elif self.pending is not None:
+            self.pending = (self.pending[0], self.pending[1] + "\n" + line)
+        else:
+            return
+        idx, text = self.pending
+        try:
+            value = ast.literal_eval(text)
+        except SyntaxError:
+            # Possibly continued on the next line.
+            return
+        except Exception:
+            self.pending = None
+            if self.on_error is not None:
+                self.on_error(idx)
+            return
+        self.pending = None
+        self.on_entry(idx, value)
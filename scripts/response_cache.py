@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import hashlib
+import json
+import sqlite3
+import time
+
+
+def cache_key(model, endpoint, prompt):
+    return hashlib.sha256(
+        json.dumps([model, endpoint, prompt], ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+class ResponseCache:
+    """Persistent store of raw model replies, keyed by cache_key().
+
+    Entries are evicted in least-recently-used order once the total size of
+    the prompts and replies exceeds `max_size` bytes (0: unbounded)."""
+
+    def __init__(self, path, max_size=1 << 30):
+        self.max_size = max_size
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used
+                ON responses(last_used);
+            """)
+        self.size = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model, endpoint, prompt):
+        key = cache_key(model, endpoint, prompt)
+        row = self.db.execute(
+            "SELECT response FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.db:
+            self.db.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return row[0]
+
+    def put(self, model, endpoint, prompt, response):
+        key = cache_key(model, endpoint, prompt)
+        size = len(prompt.encode()) + len(response.encode())
+        with self.db:
+            old = self.db.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if old is not None:
+                self.size -= old[0]
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, endpoint, prompt, response, size, time.time()),
+            )
+            self.size += size
+            if self.max_size > 0 and self.size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        rows = self.db.execute(
+            "SELECT key, size FROM responses ORDER BY last_used"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.size <= self.max_size:
+                break
+            evicted.append((key,))
+            self.size -= size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def entries(self):
+        """Yield the (prompt, response) pairs of every entry."""
+        yield from self.db.execute("SELECT prompt, response FROM responses")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+from collections import Counter, deque
+
+
+class BatchScheduler:
+    """Chooses the strings sent in each request.
+
+    Strings that fail (unusable reply or rejected translation) are retried in
+    progressively smaller batches built by bisecting the failed set, so that
+    bad strings are isolated instead of being re-sent with every new batch.
+    After `max_attempts` failures a string is parked and no longer scheduled.
+
+    Unless `adaptive` is off, the size of fresh batches follows an AIMD rule:
+    it grows by one after a clean batch that finished within
+    `target_latency` seconds, and is halved when the failure rate exceeds
+    `max_failure_rate` or the latency target is missed.
+
+    Requests that fail without a reply (network errors, 5xx responses after
+    the retries of the engine) are not failures of their strings: the batch
+    is scheduled again as is. After `max_request_failures` such requests in
+    a row, the endpoint is considered down and nothing is scheduled anymore."""
+
+    def __init__(
+        self,
+        tasks,
+        batch_size,
+        max_batch_size=None,
+        max_attempts=5,
+        adaptive=True,
+        target_latency=120.0,
+        max_failure_rate=0.2,
+        max_request_failures=10,
+    ):
+        self.tasks = tasks
+        self.batch_size = float(batch_size)
+        self.max_batch_size = max_batch_size or batch_size
+        self.max_attempts = max_attempts
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.max_failure_rate = max_failure_rate
+        self.max_request_failures = max_request_failures
+        self.request_failures = 0
+        self.attempts = Counter()
+        self.parked = set()
+        self.retries = deque()
+        self.in_flight = set()
+
+    def pending(self):
+        """Return the number of strings that may still be scheduled."""
+        if self.stalled():
+            return 0
+        return len(self.tasks) - len(self.parked.intersection(self.tasks))
+
+    def next_batch(self):
+        """Return the keys of the next request, or [] if every schedulable
+        string is already in flight."""
+        while len(self.retries) != 0:
+            batch = [
+                key
+                for key in self.retries.popleft()
+                if key in self.tasks and key not in self.in_flight
+            ]
+            if len(batch) != 0:
+                self.in_flight.update(batch)
+                return batch
+
+        batch = []
+        size = max(1, int(self.batch_size))
+        for key in self.tasks:
+            # Strings with failed attempts are only retried through bisection.
+            if key in self.in_flight or key in self.parked or key in self.attempts:
+                continue
+            batch.append(key)
+            if len(batch) == size:
+                break
+        self.in_flight.update(batch)
+        return batch
+
+    def stalled(self):
+        """Return True after `max_request_failures` failed requests in a
+        row."""
+        return self.request_failures >= self.max_request_failures
+
+    def requeue(self, batch):
+        """Schedule the strings of a request that failed without a reply
+        again, without counting an attempt."""
+        self.in_flight.difference_update(batch)
+        self.request_failures += 1
+        batch = [key for key in batch if key in self.tasks]
+        if len(batch) != 0:
+            self.retries.append(batch)
+
+    def report(self, batch, accepted, latency):
+        """Record the outcome of a request.
+
+        `accepted` is the set of keys whose translation was accepted, or None
+        if the reply could not be parsed at all."""
+        self.in_flight.difference_update(batch)
+        self.request_failures = 0
+        fresh = not any(key in self.attempts for key in batch)
+        failed = [key for key in batch if key in self.tasks]
+        for key in failed:
+            self.attempts[key] += 1
+            if self.attempts[key] >= self.max_attempts:
+                self.parked.add(key)
+        failed = [key for key in failed if key not in self.parked]
+        if len(failed) > 1:
+            half = len(failed) // 2
+            self.retries.append(failed[:half])
+            self.retries.append(failed[half:])
+        elif len(failed) == 1:
+            self.retries.append(failed)
+
+        # Retry batches are biased towards bad strings; only fresh batches
+        # drive the batch size.
+        if not self.adaptive or not fresh:
+            return
+        failure_rate = 1.0 if accepted is None else 1.0 - len(accepted) / len(batch)
+        if failure_rate > self.max_failure_rate or latency > self.target_latency:
+            self.batch_size = max(1.0, self.batch_size / 2)
+        elif failure_rate == 0.0:
+            self.batch_size = min(float(self.max_batch_size), self.batch_size + 1)
@@ -0,0 +1,279 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from metrics import approx_tokens
+from placeholder_mask import head_pattern, mask, token_pattern, unmask
+from reply_parser import ReplyParser
+from validator import Validator
+
+pseudo_table = str.maketrans("AaCcEeIiNnOoUuYy", "ÅåÇçÉéÎîÑñÖöÛûÝý")
+key_pattern = Validator(dict()).key_pattern
+
+
+def pseudo_localize(strval):
+    """Return a deterministic "translation" of `strval` that keeps its
+    placeholders and keywords, so that it passes the validator."""
+    masked, spans = mask(strval)
+    protected = [False] * len(masked)
+
+    def protect(start, end):
+        for pos in range(start, end):
+            protected[pos] = True
+
+    for match in key_pattern.finditer(masked):
+        protect(match.start(), match.start() + len(match.group(1)))
+    for pattern in [head_pattern, token_pattern]:
+        for match in pattern.finditer(masked):
+            protect(match.start(), match.end())
+    res = "".join(
+        ch if protected[pos] else ch.translate(pseudo_table)
+        for pos, ch in enumerate(masked)
+    )
+    # Prompts masked by translate.py --mask hold tokens such as <0> already;
+    # those are protected above and kept verbatim.
+    if len(spans) == 0:
+        return "[" + res + "]"
+    return unmask("[" + res + "]", spans)
+
+
+def make_reply(prompt, mode):
+    """Answer a translation prompt: every `messageN` of its last code block is
+    echoed (`mode` "echo") or pseudo-localized (`mode` "pseudo")."""
+    entries = []
+    parser = ReplyParser(lambda idx, value: entries.append((idx, value)))
+    start = prompt.rfind("```python\n")
+    if start != -1:
+        parser.feed(prompt[start:])
+        parser.close()
+    reply = "```python\n"
+    for idx, value in entries:
+        if mode == "pseudo" and isinstance(value, str):
+            value = pseudo_localize(value)
+        reply += f"message{idx} = {repr(value)}\n"
+    return reply + "```\n"
+
+
+def completion(model, reply, prompt):
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": approx_tokens(prompt),
+            "completion_tokens": approx_tokens(reply),
+            "total_tokens": approx_tokens(prompt) + approx_tokens(reply),
+        },
+    }
+
+
+def answer_batch(input_path, output_path, mode):
+    """Write the output file of a batch API job for the requests of
+    `input_path` (as written by translate_batch.py)."""
+    with open(input_path, encoding="utf-8") as f, open(
+        output_path, "w", encoding="utf-8"
+    ) as out:
+        for line in f:
+            request = json.loads(line)
+            body = request["body"]
+            prompt = body["messages"][-1]["content"]
+            res = {
+                "id": "batch_req_stub",
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": "stub",
+                    "body": completion(
+                        body.get("model", ""), make_reply(prompt, mode), prompt
+                    ),
+                },
+                "error": None,
+            }
+            out.write(json.dumps(res, ensure_ascii=False) + "\n")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        super().__init__(address, StubHandler)
+        self.options = options
+        self.lock = threading.Lock()
+        self.random = random.Random(options.seed)
+        self.requests = 0
+
+    def handle_error(self, request, client_address):
+        # Clients closing their connections are not errors.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Chat completions endpoint, configured by the command line options of
+    the server."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, obj, headers={}):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        options = self.server.options
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        with self.server.lock:
+            self.server.requests += 1
+            draw = self.server.random.random()
+        if draw < options.rate_limit_rate:
+            self.send_json(
+                429,
+                {"error": {"message": "rate limited", "type": "rate_limit"}},
+                {"Retry-After": str(options.retry_after)},
+            )
+            return
+        if draw < options.rate_limit_rate + options.error_rate:
+            self.send_json(500, {"error": {"message": "injected failure"}})
+            return
+
+        model = body.get("model", "")
+        prompt = body["messages"][-1]["content"]
+        reply = make_reply(prompt, options.mode)
+        time.sleep(options.latency)
+        if not body.get("stream", False):
+            if options.tokens_per_second > 0:
+                time.sleep(approx_tokens(reply) / options.tokens_per_second)
+            self.send_json(200, completion(model, reply, prompt))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for pos in range(0, len(reply), options.chunk_size):
+            text = reply[pos : pos + options.chunk_size]
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": {"content": text}, "finish_reason": None}
+                ],
+            }
+            self.send_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            if options.tokens_per_second > 0:
+                time.sleep(approx_tokens(text) / options.tokens_per_second)
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local OpenAI-compatible endpoint returning deterministic "
+        "translations, for testing and benchmarking"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument(
+        "--mode",
+        choices=["echo", "pseudo"],
+        default="pseudo",
+        help="Return the messages unchanged or pseudo-localized",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.5,
+        help="Seconds before the first token of a reply",
+    )
+    parser.add_argument(
+        "--tokens-per-second",
+        type=float,
+        default=0,
+        help="Generation speed of a reply (0: unlimited)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=16,
+        help="Number of characters per streamed chunk",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests failing with a 500 error",
+    )
+    parser.add_argument(
+        "--rate-limit-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests rejected with a 429 error",
+    )
+    parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=1.0,
+        help="Retry-After header of the 429 responses (seconds)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the injection")
+    parser.add_argument(
+        "--batch-input",
+        help="Answer the requests of this batch input file instead of serving",
+    )
+    parser.add_argument(
+        "--batch-output", help="Batch output file written for --batch-input"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log requests")
+    args = parser.parse_args()
+
+    if args.batch_input is not None:
+        if args.batch_output is None:
+            parser.error("--batch-input requires --batch-output")
+        answer_batch(args.batch_input, args.batch_output, args.mode)
+        return
+
+    server = StubServer((args.host, args.port), args)
+    print(f"Serving on http://{args.host}:{server.server_port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print("Requests:", server.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,127 +3,38 @@
 # This file is licensed under the MIT License.
 # See the LICENSE file for more information.
 
-import hashlib
-from openai import OpenAI
-import sys
+from openai import OpenAI, AsyncOpenAI
+import argparse
+import asyncio
 import os
+import time
 import ast
-import copy
-
-corpus = list(open(sys.argv[1]).read().splitlines())
-prompt = open(sys.argv[2]).read()
-errata = open(sys.argv[3]).read().splitlines()
-output = sys.argv[4]
-batch_size = int(sys.argv[5])
-
-endpoint = os.environ["LLM_ENDPOINT"]
-model = os.environ["LLM_MODEL"]
-token = os.environ["LLM_TOKEN"]
-client = OpenAI(api_key=token, base_url=endpoint)
-
-
-def compute_hash(strval: str):
-    return "H" + hashlib.sha1(strval.encode("utf-8")).digest().hex()[:12].upper()
-
-
-errata_map = dict()
-for strval in errata:
-    pos = strval.find(" ")
-    if pos == -1:
-        continue
-    errata_map[strval[:pos]] = strval[pos + 1 :]
-
-keys = [
-    "%0",
-    "%1",
-    "%2",
-    "%3",
-    "%4",
-    "%5",
-    "%6",
-    "%7",
-    "%8",
-    "%9",
-    "%select{",
-    "%enum_select<",
-    "%plural{",
-    "%ordinal",
-    "%human",
-    "%objcclass",
-    "%objcinstance",
-    "%q",
-    "%diff{",
-    "%sub{",
-    "|",
-    "{",
-    "}",
-    "\\",
-    "\\n",
-    "consteval",
-    "constexpr",
-    "constinit",
-    "const_cast",
-    "dynamic_cast",
-    "reinterpret_cast",
-    "static_cast",
-    "typeid",
-    "typename",
-    "co_await",
-    "co_return",
-    "co_yield",
-    "alignas",
-    "alignof",
-    "decltype",
-    "goto",
-    "noexcept",
-    "nullptr",
-    "static_assert",
-    "thread_local",
-    "#pragma",
-    "X86",
-    "ARM",
-    "AArch64",
-    "RISCV",
-    "RISC-V",
-    "MIPS",
-    "SPARC",
-    "PowerPC",
-    "Alpha",
-    "AMDGPU",
-    "M68k",
-    "SystemZ",
-    "NVPTX",
-    "WebAssembly",
-    "JIT",
-    "GNU",
-    "MSVC",
-    "DXIL",
-    "Visual Studio",
-]
-
-
-def validate(src, tgt):
-    if not isinstance(tgt, str):
-        return False
-    for k in keys:
-        if src.count(k) != tgt.count(k):
-            return False
-    for k, v in errata_map.items():
-        should_contain = False
-        if k.startswith("!"):
-            should_contain = True
-            k = k[1:]
-        if k in src or k.capitalize() in src:
-            if should_contain:
-                if v not in tgt:
-                    return False
-            elif v in tgt:
-                return False
-    return True
-
-
-def chat(prompt):
-    print(prompt)
+from collections import Counter
+from i18n_common import compute_hash, build_batch_prompt
+from async_engine import AsyncChat, RateLimiter
+from validator import Validator, load_errata
+from scheduler import BatchScheduler
+from translation_memory import TranslationMemory, read_pairs
+from response_cache import ResponseCache
+from reply_parser import ReplyParser
+from metrics import Metrics
+from placeholder_mask import mask, unmask, prompt_note
+
+
+def chat(client, model, prompt, cache=None, parser=None, echo=False):
+    if echo:
+        print(prompt)
+    endpoint = str(client.base_url)
+    if cache is not None:
+        content = cache.get(model, endpoint, prompt)
+        if content is not None:
+            if echo:
+                print("Cached reply:")
+                print(content)
+            if parser is not None:
+                parser.feed(content)
+                parser.close()
+            return content
     content = ""
     try:
         completion = client.chat.completions.create(
@@ -136,6 +47,8 @@ def chat(prompt):
         for chunk in completion:
             delta = chunk.choices[0].delta
             if hasattr(delta, "reasoning_content") and delta.reasoning_content != None:
+                if not echo:
+                    continue
                 if not is_thinking:
                     print("Thinking:")
                     is_thinking = True
@@ -143,85 +56,619 @@ def chat(prompt):
             else:
                 if delta.content is not None:
                     content += delta.content
-                    print(delta.content, end="", flush=True)
+                    if parser is not None:
+                        parser.feed(delta.content)
+                    if echo:
+                        print(delta.content, end="", flush=True)
 
     except Exception as e:
         print(e)
         return ""
-    print("")
+    if echo:
+        print("")
+    if parser is not None:
+        parser.close()
+    if cache is not None and len(content) != 0:
+        cache.put(model, endpoint, prompt, content)
     return content
 
 
-tasks = dict()
-corpus_map = dict()
-for strval in corpus:
-    hash = compute_hash(ast.literal_eval(strval))
-    corpus_map[hash] = ast.literal_eval(strval)
-    tasks[hash] = strval
+class Corpus:
+    """Parsed corpus, shared by the translators of all locales."""
+
+    def __init__(self, path):
+        # (literal, hash) pairs in corpus order.
+        self.entries = []
+        self.strings = dict()
+        for strval in open(path).read().splitlines():
+            value = ast.literal_eval(strval)
+            hash = compute_hash(value)
+            self.strings[hash] = value
+            self.entries.append((strval, hash))
+
+
+class Translator:
+    """Translation state of one locale: pending tasks and accepted results.
+
+    Accepted translations are appended to `<output>.journal` as soon as
+    they are validated, synced after every batch and folded into the sorted
+    output file by compact().
+
+    If a translation memory is given, it is seeded with the accepted
+    translations and used by prefill() and to add similar reviewed
+    translations (up to `examples` per string) to the prompts.
 
-translation = dict()
+    With `masked_prompts`, placeholders and keywords are replaced by opaque
+    tokens in the prompts and restored in the replies before validation."""
 
+    def __init__(
+        self,
+        corpus,
+        prompt,
+        errata_map,
+        output,
+        compact_every=50,
+        memory=None,
+        examples=3,
+        masked_prompts=False,
+    ):
+        self.prompt = prompt
+        self.validator = Validator(errata_map)
+        self.output = output
+        self.journal_path = output + ".journal"
+        self.compact_every = compact_every
+        self.corpus_map = corpus.strings
+        self.corpus_hashes = corpus.entries
+        self.tasks = dict()
+        for strval, hash in corpus.entries:
+            self.tasks[hash] = strval
+        self.translation = dict()
+        self.batches = 0
+        self.journal = None
+        self.memory = memory
+        self.examples = examples
+        self.masked_prompts = masked_prompts
+        self.masks = dict()
+        self.masked_keys = None
 
-def dump():
-    with open(output, "w") as f:
-        for strval in corpus:
-            hash = compute_hash(ast.literal_eval(strval))
-            if hash in translation:
-                f.write(f"# {strval}\n{hash}: {repr(translation[hash])}\n")
+        # Replay the journal on top of the output to resume after a crash.
+        if os.path.exists(output):
+            with open(output, encoding="utf-8") as f:
+                self.load(output, f.readlines())
+        if os.path.exists(self.journal_path):
+            self.load(self.journal_path, self.read_journal())
+        self.compact()
+        if memory is not None:
+            for key, value in self.translation.items():
+                memory.add(self.corpus_map[key], value)
 
+    def read_journal(self):
+        """Return the complete lines of the journal. A crash while appending
+        to it may leave a torn last line, possibly cut inside a UTF-8
+        sequence; such lines are skipped, and dropped by the compaction that
+        follows the replay."""
+        lines = []
+        with open(self.journal_path, "rb") as f:
+            for data in f:
+                try:
+                    line = data.decode("utf-8")
+                except UnicodeDecodeError:
+                    line = ""
+                if not line.endswith("\n"):
+                    print(f"{self.journal_path}: skipping torn line")
+                    continue
+                lines.append(line)
+        return lines
 
-if os.path.exists(output):
-    with open(output) as f:
-        for line in f.readlines():
+    def load(self, path, lines):
+        for line in lines:
             if not line.startswith("H"):
                 continue
             key = line[:13]
-            value = ast.literal_eval(line[15:])
-            if key not in corpus_map:
+            if key not in self.corpus_map:
                 continue
-            src = corpus_map[key]
-            if not validate(src, value):
+            try:
+                value = ast.literal_eval(line[15:])
+            except (SyntaxError, ValueError):
+                print(f"{path}: skipping malformed entry {key}")
                 continue
-            translation[key] = value
-            tasks.pop(key)
-        dump()
+            # Left by a lossy decode or a bad edit; never written back.
+            if isinstance(value, str) and "\ufffd" in value:
+                print(f"{path}: skipping entry {key} with invalid characters")
+                continue
+            src = self.corpus_map[key]
+            if self.validator.validate(src, value) is not None:
+                continue
+            self.translation[key] = value
+            self.tasks.pop(key, None)
 
+    def compact(self):
+        """Rewrite the output file from scratch and truncate the journal."""
+        tmp_path = self.output + ".tmp"
+        with open(tmp_path, "w") as f:
+            for strval, hash in self.corpus_hashes:
+                if hash in self.translation:
+                    f.write(f"# {strval}\n{hash}: {repr(self.translation[hash])}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.output)
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = open(self.journal_path, "w")
 
-def expand(code):
-    exec(code)
-    return copy.deepcopy(locals())
+    def commit(self):
+        """Sync the journal at the end of a batch, compacting every
+        `compact_every` batches."""
+        os.fsync(self.journal.fileno())
+        self.batches += 1
+        if self.compact_every > 0 and self.batches % self.compact_every == 0:
+            self.compact()
 
+    def remember(self, path):
+        """Add the valid entries of another translation file to the memory."""
+        for src, tgt in read_pairs(path):
+            if self.validator.validate(src, tgt) is None:
+                self.memory.add(src, tgt)
 
-print("Tasks", len(tasks))
+    def prefill(self):
+        """Accept the translations of the memory whose source only differs in
+        argument numbering. Returns the number of reused translations."""
+        reused = 0
+        for key in list(self.tasks):
+            src = self.corpus_map[key]
+            tgt = self.memory.lookup(src)
+            if tgt is None or self.validator.validate(src, tgt) is not None:
+                continue
+            self.translation[key] = tgt
+            self.tasks.pop(key)
+            reused += 1
+        if reused != 0:
+            self.compact()
+        return reused
 
-while len(tasks) != 0:
-    batch = list(tasks.keys())[:batch_size]
-    batch_prompt = prompt
-    batch_prompt += """\n```python\n"""
-    for idx, key in enumerate(batch):
-        batch_prompt += f"message{idx} = {tasks[key]}\n"
-    batch_prompt += "```\n"
+    def get_mask(self, key):
+        """Return the (masked, spans) pair of a corpus string."""
+        if key not in self.masks:
+            self.masks[key] = mask(self.corpus_map[key])
+        return self.masks[key]
 
-    ret = chat(batch_prompt)
-    if "```" not in ret:
-        continue
+    def find_masked(self, masked):
+        """Return a key whose string is masked as `masked`, preferring
+        pending ones."""
+        if self.masked_keys is None:
+            self.masked_keys = dict()
+            for key in self.corpus_map:
+                self.masked_keys.setdefault(self.get_mask(key)[0], []).append(key)
+        keys = self.masked_keys.get(masked, [None])
+        return next((key for key in keys if key in self.tasks), keys[0])
 
-    start = ret.find("\n", ret.find("```"))
-    end = ret.find("```", start + 1)
-    eval_code = ret[start + 1 : end]
-    try:
-        res = expand(eval_code)
-    except Exception as e:
-        print(e)
-        continue
-    for idx, key in enumerate(batch):
-        var = f"message{idx}"
-        if var in res:
-            src = ast.literal_eval(tasks[key])
-            hash = compute_hash(src)
-            if not validate(src, res[var]):
+    def replay(self, cache):
+        """Apply the cached replies to the prompts of this locale, validating
+        them with the current rules. Returns the number of accepted
+        translations."""
+        accepted = 0
+        for prompt, response in cache.entries():
+            if not prompt.startswith(self.prompt):
+                continue
+            masked = prompt_note in prompt
+            batch = []
+            try:
+                code = prompt[prompt.rfind("```python\n") :]
+                for line in code.splitlines():
+                    if line.startswith("message"):
+                        value = ast.literal_eval(line[line.find(" = ") + 3 :])
+                        if masked:
+                            batch.append(self.find_masked(value))
+                        else:
+                            batch.append(compute_hash(value))
+            except (SyntaxError, ValueError):
+                continue
+            accepted += len(self.apply_reply(batch, response, masked) or [])
+        self.commit()
+        return accepted
+
+    def close(self):
+        self.compact()
+        self.journal.close()
+        os.remove(self.journal_path)
+
+    def build_prompt(self, batch):
+        batch_prompt = self.prompt
+        if self.masked_prompts:
+            batch_prompt += prompt_note
+        if self.memory is not None and self.examples > 0:
+            seen = set()
+            references = ""
+            for key in batch:
+                for src, tgt, _ in self.memory.similar(
+                    self.corpus_map[key], self.examples
+                ):
+                    if src not in seen:
+                        seen.add(src)
+                        references += f"{repr(src)} => {repr(tgt)}\n"
+            if len(references) != 0:
+                batch_prompt += (
+                    "\nReviewed translations of similar messages, for reference:\n"
+                    + references
+                )
+        literals = []
+        for key in batch:
+            literal = self.tasks[key]
+            if self.masked_prompts:
+                masked, spans = self.get_mask(key)
+                if len(spans) != 0:
+                    literal = repr(masked)
+            literals.append(literal)
+        return build_batch_prompt(batch_prompt, literals)
+
+    def accept(self, key, value, masked=False):
+        """Record `value` as the translation of `key` if it is valid. If
+        `masked`, the masked parts of `value` are restored first.
+        Returns None if it was accepted, otherwise the reason of the
+        rejection."""
+        if key not in self.tasks:
+            return "duplicate"
+        if masked and isinstance(value, str):
+            value = unmask(value, self.get_mask(key)[1])
+            if value is None:
+                return "mask token"
+        src = self.corpus_map[key]
+        reason = self.validator.validate(src, value)
+        if reason is not None:
+            return reason
+        self.translation[key] = value
+        self.tasks.pop(key)
+        self.journal.write(f"{key}: {repr(value)}\n")
+        self.journal.flush()
+        if self.memory is not None:
+            self.memory.add(src, value)
+        return None
+
+    def reply_parser(self, batch, outcome, masked=None):
+        """Return a parser accepting the translations of `batch` as they are
+        streamed. The dict `outcome` maps the keys of the parsed entries to
+        None if they were accepted, otherwise to the rejection reason.
+        `masked` defaults to the masking mode of the prompts."""
+        if masked is None:
+            masked = self.masked_prompts
+
+        def on_entry(idx, value):
+            if idx < len(batch) and outcome.get(batch[idx], "") is not None:
+                outcome[batch[idx]] = self.accept(batch[idx], value, masked)
+
+        def on_error(idx):
+            if idx < len(batch) and outcome.get(batch[idx], "") is not None:
+                outcome[batch[idx]] = "parse error"
+
+        return ReplyParser(on_entry, on_error)
+
+    def apply_reply(self, batch, ret, masked=None):
+        """Validate a complete model reply and record the accepted
+        translations.
+
+        Returns the set of accepted keys, or None if the reply does not
+        contain a code block."""
+        outcome = dict()
+        parser = self.reply_parser(batch, outcome, masked)
+        parser.feed(ret)
+        parser.close()
+        accepted, _ = batch_outcome(batch, parser, outcome, ret)
+        return accepted
+
+
+def batch_outcome(batch, parser, outcome, reply):
+    """Return (accepted, reasons) for a finished request: the set of accepted
+    keys (None if the reply was unusable) and the number of rejected strings
+    of each failure reason."""
+    accepted = set(key for key, reason in outcome.items() if reason is None)
+    reasons = Counter()
+    for key in batch:
+        if key in outcome:
+            if outcome[key] is not None:
+                reasons[outcome[key]] += 1
+        elif len(reply) == 0:
+            reasons["request failed"] += 1
+        elif not parser.seen_code:
+            reasons["missing fence"] += 1
+        else:
+            reasons["missing entry"] += 1
+    if not parser.seen_code and len(accepted) == 0:
+        return None, reasons
+    return accepted, reasons
+
+
+def report_outcome(scheduler, batch, accepted, latency, reply):
+    """Report a validated reply to the scheduler. A request that failed
+    without a reply says nothing about its strings, so they are only
+    scheduled again."""
+    if len(reply) == 0:
+        scheduler.requeue(batch)
+    else:
+        scheduler.report(batch, accepted, latency)
+
+
+def run(translator, scheduler, client, model, cache, echo, metrics):
+    while scheduler.pending() != 0:
+        batch = scheduler.next_batch()
+        start = time.monotonic()
+        outcome = dict()
+        parser = translator.reply_parser(batch, outcome)
+        prompt = translator.build_prompt(batch)
+        reply = chat(client, model, prompt, cache, parser, echo)
+        latency = time.monotonic() - start
+        accepted, reasons = batch_outcome(batch, parser, outcome, reply)
+        report_outcome(scheduler, batch, accepted, latency, reply)
+        metrics.record(len(batch), len(accepted or []), reasons, latency, prompt, reply)
+        print(
+            f"accepted {len(accepted or [])}/{len(batch)},",
+            f"remaining {len(translator.tasks)},",
+            f"batch size {int(scheduler.batch_size)}",
+            flush=True,
+        )
+        if accepted is not None:
+            translator.commit()
+
+
+async def process_batch(translator, scheduler, engine, batch, metrics, locale=""):
+    """Send one batch and record its outcome. Translations are accepted as
+    they are streamed, so a truncated reply still yields its complete
+    entries. Returns the accepted keys."""
+    start = time.monotonic()
+    outcome = dict()
+    parser = translator.reply_parser(batch, outcome)
+    prompt = translator.build_prompt(batch)
+    reply = await engine.chat(prompt, parser)
+    latency = time.monotonic() - start
+    accepted, reasons = batch_outcome(batch, parser, outcome, reply)
+    report_outcome(scheduler, batch, accepted, latency, reply)
+    metrics.record(
+        len(batch), len(accepted or []), reasons, latency, prompt, reply, locale
+    )
+    if accepted is not None:
+        translator.commit()
+    return accepted
+
+
+async def run_async(translator, scheduler, engine, concurrency, metrics):
+    """Keep up to `concurrency` batches in flight until all tasks are done."""
+    changed = asyncio.Event()
+
+    async def worker(worker_id):
+        while scheduler.pending() != 0:
+            batch = scheduler.next_batch()
+            if len(batch) == 0:
+                # Everything left is in flight; wait for a batch to finish in
+                # case it needs to be retried.
+                changed.clear()
+                await changed.wait()
                 continue
-            translation[hash] = res[var]
-            tasks.pop(hash)
+            accepted = await process_batch(
+                translator, scheduler, engine, batch, metrics
+            )
+            changed.set()
+            print(
+                f"[{worker_id}] accepted {len(accepted or [])}/{len(batch)},",
+                f"remaining {len(translator.tasks)},",
+                f"batch size {int(scheduler.batch_size)}",
+                flush=True,
+            )
+
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+
+
+def add_translate_arguments(parser):
+    """Add the options shared with translate_all.py."""
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        help="Upper bound of the adaptive batch size (default: 2 * batch_size)",
+    )
+    parser.add_argument(
+        "--fixed-batch-size",
+        action="store_true",
+        help="Do not adapt the batch size to failures and latency",
+    )
+    parser.add_argument(
+        "--target-latency",
+        type=float,
+        default=120,
+        help="Shrink the batch size when a request takes longer (seconds)",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=5,
+        help="Stop retrying a string after it failed this many times",
+    )
+    parser.add_argument(
+        "--max-request-failures",
+        type=int,
+        default=10,
+        help="Stop after this many requests in a row failed without a reply",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of requests kept in flight. Values greater than one "
+        "enable the asyncio engine",
+    )
+    parser.add_argument(
+        "--rpm", type=float, default=0, help="Request rate limit per minute"
+    )
+    parser.add_argument(
+        "--tpm", type=float, default=0, help="Estimated token rate limit per minute"
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=8,
+        help="Retries with exponential backoff on 429/5xx errors",
+    )
+    parser.add_argument(
+        "--compact-every",
+        type=int,
+        default=50,
+        help="Rewrite the output file from the journal every K batches "
+        "(0: only at exit)",
+    )
+    parser.add_argument(
+        "--examples",
+        type=int,
+        default=3,
+        help="Similar reviewed translations added to the prompt per string",
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Do not reuse existing translations",
+    )
+    parser.add_argument(
+        "--mask",
+        action="store_true",
+        help="Replace placeholders and keywords with opaque tokens in the "
+        "prompts and restore them in the replies",
+    )
+    parser.add_argument(
+        "--cache",
+        help="Path to the response cache. Cached replies are reused instead "
+        "of sending the same prompt again, and re-validated at startup",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Size limit of the response cache in MiB (0: unlimited)",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=60,
+        help="Seconds between two metrics summary lines (0: only at exit)",
+    )
+    parser.add_argument(
+        "--metrics-json", help="Write a final JSON report of the run metrics"
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        help="Keep the run metrics in a Prometheus textfile at this path",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only re-validate the cached replies, without sending requests",
+    )
+
+
+def make_scheduler(translator, args):
+    return BatchScheduler(
+        translator.tasks,
+        args.batch_size,
+        args.max_batch_size or 2 * args.batch_size,
+        args.max_attempts,
+        not args.fixed_batch_size,
+        args.target_latency,
+        max_request_failures=args.max_request_failures,
+    )
+
+
+def make_engine(args, endpoint, model, token, cache):
+    client = AsyncOpenAI(api_key=token, base_url=endpoint, max_retries=0)
+    return AsyncChat(
+        client,
+        model,
+        RateLimiter(args.rpm),
+        RateLimiter(args.tpm),
+        args.max_retries,
+        cache=cache,
+    )
+
+
+def open_cache(args):
+    if args.cache is None:
+        return None
+    return ResponseCache(args.cache, args.cache_size << 20)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Translate the corpus with an OpenAI-compatible LLM"
+    )
+    parser.add_argument("corpus", help="Path to the corpus file")
+    parser.add_argument("prompt", help="Path to the prompt file")
+    parser.add_argument("errata", help="Path to the errata file")
+    parser.add_argument("output", help="Path to the translation file")
+    parser.add_argument(
+        "batch_size", type=int, help="Initial number of strings per request"
+    )
+    add_translate_arguments(parser)
+    parser.add_argument(
+        "--memory",
+        action="append",
+        default=[],
+        help="Additional translation file used as translation memory",
+    )
+    parser.add_argument(
+        "--echo",
+        action="store_true",
+        help="Print the prompts and the streamed replies (without --concurrency)",
+    )
+    args = parser.parse_args()
+
+    endpoint = os.environ["LLM_ENDPOINT"]
+    model = os.environ["LLM_MODEL"]
+    # No request is sent in offline mode, so no token is needed.
+    token = None if args.offline else os.environ["LLM_TOKEN"]
+
+    prompt = open(args.prompt).read()
+    translator = Translator(
+        Corpus(args.corpus),
+        prompt,
+        load_errata(args.errata),
+        args.output,
+        args.compact_every,
+        None if args.no_memory else TranslationMemory(),
+        args.examples,
+        args.mask,
+    )
+    if translator.memory is not None:
+        for path in args.memory:
+            translator.remember(path)
+        print("Reused", translator.prefill(), "translations from memory")
+    cache = open_cache(args)
+    if cache is not None:
+        print("Replayed", translator.replay(cache), "translations from cache")
+    print("Tasks", len(translator.tasks))
+
+    scheduler = make_scheduler(translator, args)
+    metrics = Metrics(args.metrics_interval, args.metrics_prom)
+    metrics.cache = cache
+    try:
+        if not args.offline:
+            translate(
+                translator, scheduler, args, endpoint, model, token, cache, metrics
+            )
+    finally:
+        # Also reached on SIGINT (KeyboardInterrupt).
+        translator.close()
+        metrics.finish(args.metrics_json)
+        if cache is not None:
+            cache.close()
+    if len(scheduler.parked) != 0:
+        print("Parked", len(scheduler.parked), "strings after repeated failures")
+    if scheduler.stalled():
+        print("Stopped after", scheduler.request_failures, "failed requests in a row")
+
+
+def translate(translator, scheduler, args, endpoint, model, token, cache, metrics):
+    if args.concurrency > 1:
+        engine = make_engine(args, endpoint, model, token, cache)
+        metrics.engine = engine
+        asyncio.run(run_async(translator, scheduler, engine, args.concurrency, metrics))
+    else:
+        client = OpenAI(api_key=token, base_url=endpoint)
+        run(translator, scheduler, client, model, cache, args.echo, metrics)
+
 
-    dump()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import argparse
+import asyncio
+import os
+from translate import (
+    Corpus,
+    Translator,
+    add_translate_arguments,
+    make_engine,
+    make_scheduler,
+    open_cache,
+    process_batch,
+)
+from translation_memory import TranslationMemory
+from metrics import Metrics
+from validator import load_errata
+
+
+class Job:
+    def __init__(self, name, translator, scheduler):
+        self.name = name
+        self.translator = translator
+        self.scheduler = scheduler
+        self.total = len(translator.tasks)
+
+
+async def run_all(jobs, engine, concurrency, metrics):
+    """Share `concurrency` request slots between the locales.
+
+    Idle workers take the next batch of the locales in round-robin order, so
+    every locale with pending strings gets the same share of requests."""
+    changed = asyncio.Event()
+    turn = 0
+
+    def next_job():
+        nonlocal turn
+        for i in range(len(jobs)):
+            job = jobs[(turn + i) % len(jobs)]
+            batch = job.scheduler.next_batch()
+            if len(batch) != 0:
+                turn = (turn + i + 1) % len(jobs)
+                return job, batch
+        return None, []
+
+    async def worker():
+        while any(job.scheduler.pending() != 0 for job in jobs):
+            job, batch = next_job()
+            if job is None:
+                # Everything left is in flight; wait for a batch to finish in
+                # case it needs to be retried.
+                changed.clear()
+                await changed.wait()
+                continue
+            accepted = await process_batch(
+                job.translator, job.scheduler, engine, batch, metrics, job.name
+            )
+            changed.set()
+            done = job.total - len(job.translator.tasks)
+            print(
+                f"[{job.name}] accepted {len(accepted or [])}/{len(batch)},",
+                f"progress {done}/{job.total},",
+                f"batch size {int(job.scheduler.batch_size)}",
+                flush=True,
+            )
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Translate the corpus into several locales with one "
+        "shared request scheduler"
+    )
+    parser.add_argument("corpus", help="Path to the corpus file")
+    parser.add_argument(
+        "batch_size", type=int, help="Initial number of strings per request"
+    )
+    parser.add_argument(
+        "locales",
+        nargs="*",
+        help="Locales whose prompt, errata and translation files are in "
+        "--i18n-dir (default: all of them)",
+    )
+    parser.add_argument(
+        "--i18n-dir",
+        default=os.path.join(os.path.dirname(__file__), "..", "i18n"),
+        help="Directory of the <locale>.prompt/.errata/.yml files",
+    )
+    parser.add_argument(
+        "--locale",
+        nargs=4,
+        action="append",
+        default=[],
+        metavar=("NAME", "PROMPT", "ERRATA", "OUTPUT"),
+        help="Translate an additional locale with explicit files",
+    )
+    add_translate_arguments(parser)
+    args = parser.parse_args()
+
+    endpoint = os.environ["LLM_ENDPOINT"]
+    model = os.environ["LLM_MODEL"]
+    # No request is sent in offline mode, so no token is needed.
+    token = None if args.offline else os.environ["LLM_TOKEN"]
+
+    locales = []
+    names = args.locales
+    if len(names) == 0 and len(args.locale) == 0:
+        names = sorted(
+            file[: -len(".prompt")]
+            for file in os.listdir(args.i18n_dir)
+            if file.endswith(".prompt")
+        )
+    for name in names:
+        base = os.path.join(args.i18n_dir, name)
+        locales.append((name, base + ".prompt", base + ".errata", base + ".yml"))
+    locales += args.locale
+
+    corpus = Corpus(args.corpus)
+    cache = open_cache(args)
+    metrics = Metrics(args.metrics_interval, args.metrics_prom)
+    metrics.cache = cache
+    jobs = []
+    try:
+        for name, prompt, errata, output in locales:
+            translator = Translator(
+                corpus,
+                open(prompt).read(),
+                load_errata(errata),
+                output,
+                args.compact_every,
+                None if args.no_memory else TranslationMemory(),
+                args.examples,
+                args.mask,
+            )
+            reused = 0 if translator.memory is None else translator.prefill()
+            replayed = 0 if cache is None else translator.replay(cache)
+            # After the reuse, so that the progress only counts the strings
+            # left to request.
+            jobs.append(Job(name, translator, make_scheduler(translator, args)))
+            print(
+                f"[{name}] tasks {len(translator.tasks)}, reused {reused},",
+                f"replayed {replayed}",
+            )
+
+        if not args.offline:
+            engine = make_engine(args, endpoint, model, token, cache)
+            metrics.engine = engine
+            asyncio.run(run_all(jobs, engine, args.concurrency, metrics))
+    finally:
+        # Also reached on SIGINT (KeyboardInterrupt).
+        for job in jobs:
+            job.translator.close()
+        metrics.finish(args.metrics_json)
+        if cache is not None:
+            cache.close()
+
+    for job in jobs:
+        print(
+            f"{job.name}: translated {job.total - len(job.translator.tasks)}",
+            f"of {job.total}, parked {len(job.scheduler.parked)}",
+        )
+        if job.scheduler.stalled():
+            print(f"{job.name}: stopped after repeated request failures")
+
+
+if __name__ == "__main__":
+    main()
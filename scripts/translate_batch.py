@@ -3,43 +3,191 @@
 # This file is licensed under the MIT License.
 # See the LICENSE file for more information.
 
-import hashlib
-import sys
-import os
+import argparse
 import ast
+import gzip
 import json
+import os
+import secrets
+from i18n_common import compute_hash, build_batch_prompt
+from validator import Validator, load_errata
+
+
+class ShardWriter:
+    """Splits JSONL lines into numbered shards `<prefix>-NNNNN.jsonl[.gz]`
+    of at most `max_lines` lines and `max_bytes` bytes (before compression)."""
+
+    def __init__(self, prefix, max_lines, max_bytes, compress):
+        self.prefix = prefix
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.shards = []
+        self.file = None
+
+    def open_shard(self):
+        self.close()
+        path = f"{self.prefix}-{len(self.shards):05d}.jsonl"
+        if self.compress:
+            path += ".gz"
+            self.file = gzip.open(path, "wb")
+        else:
+            self.file = open(path, "wb")
+        # Relative to the manifest, which is written next to the shards.
+        self.shards.append({"path": os.path.basename(path), "lines": 0, "bytes": 0})
+
+    def write(self, line):
+        """Write a line and return the index of its shard."""
+        data = (line + "\n").encode("utf-8")
+        if len(data) > self.max_bytes:
+            raise ValueError(f"request of {len(data)} bytes exceeds --max-bytes")
+        shard = self.shards[-1] if len(self.shards) != 0 else None
+        if (
+            shard is None
+            or shard["lines"] == self.max_lines
+            or shard["bytes"] + len(data) > self.max_bytes
+        ):
+            self.open_shard()
+            shard = self.shards[-1]
+        self.file.write(data)
+        shard["lines"] += 1
+        shard["bytes"] += len(data)
+        return len(self.shards) - 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
-corpus = list(open(sys.argv[1]).read().splitlines())
-prompt = open(sys.argv[2]).read()
-output = sys.argv[3]
 
-endpoint = os.environ["LLM_ENDPOINT"]
-model = os.environ["LLM_MODEL"]
+def load_submitted(paths):
+    """Return the hashes requested by the manifests of earlier submissions."""
+    hashes = set()
+    for path in paths:
+        with open(path) as f:
+            for request in json.load(f)["requests"].values():
+                hashes.update(request["hashes"])
+    return hashes
 
 
-def compute_hash(str: str):
-    return "H" + hashlib.sha1(str.encode("utf-8")).digest().hex()[:12].upper()
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write batch API requests for the untranslated strings"
+    )
+    parser.add_argument("corpus", help="Path to the corpus file")
+    parser.add_argument("prompt", help="Path to the prompt file")
+    parser.add_argument(
+        "output",
+        help="Output prefix: requests are written to <output>-NNNNN.jsonl and "
+        "the manifest to <output>.manifest.json",
+    )
+    parser.add_argument(
+        "--translation",
+        help="Skip the strings with a valid translation in this file",
+    )
+    parser.add_argument(
+        "--errata",
+        help="Errata file used to validate the existing translations "
+        "(default: the .errata file next to --translation)",
+    )
+    parser.add_argument(
+        "--submitted",
+        action="append",
+        default=[],
+        help="Skip the strings requested by this earlier manifest",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=20, help="Number of strings per request"
+    )
+    parser.add_argument(
+        "--max-lines",
+        type=int,
+        default=50000,
+        help="Maximum number of requests per shard",
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=200 << 20,
+        help="Maximum size of a shard in bytes, before compression",
+    )
+    parser.add_argument("--gzip", action="store_true", help="Compress the shards")
+    args = parser.parse_args()
+    if args.translation is not None and args.errata is None:
+        args.errata = os.path.splitext(args.translation)[0] + ".errata"
+        if not os.path.exists(args.errata):
+            parser.error(f"--translation needs --errata, {args.errata} not found")
 
+    endpoint = os.environ["LLM_ENDPOINT"]
+    model = os.environ["LLM_MODEL"]
 
-with open(output, "w", encoding="utf-8") as fout:
+    corpus = list(open(args.corpus).read().splitlines())
+    prompt = open(args.prompt).read()
+
+    corpus_map = dict()
     for val in corpus:
         src = ast.literal_eval(val)
-        batch_prompt = prompt
-        batch_prompt += """\n```python\n"""
-        batch_prompt += f"message = {val}\n"
-        batch_prompt += "```\n"
+        corpus_map[compute_hash(src)] = src
+    skipped = load_submitted(args.submitted)
+    if args.translation is not None and os.path.exists(args.translation):
+        validator = Validator(load_errata(args.errata))
+        for key, reason in validator.validate_file(args.translation, corpus_map):
+            if reason is None:
+                skipped.add(key)
+
+    tasks = []
+    for val in corpus:
+        hash = compute_hash(ast.literal_eval(val))
+        if hash not in skipped:
+            tasks.append((hash, val))
+            # Duplicated corpus entries are requested once.
+            skipped.add(hash)
+
+    writer = ShardWriter(args.output, args.max_lines, args.max_bytes, args.gzip)
+    # The custom_ids are prefixed with a random submission id, so the results
+    # of a submission never match the manifest of another one.
+    submission = secrets.token_hex(8)
+    requests = dict()
+    for start in range(0, len(tasks), args.batch_size):
+        batch = tasks[start : start + args.batch_size]
+        custom_id = f"{submission}-{len(requests)}"
         body = {
             "model": model,
             "messages": [
-                {"role": "user", "content": batch_prompt},
+                {
+                    "role": "user",
+                    "content": build_batch_prompt(prompt, [val for _, val in batch]),
+                },
             ],
         }
         request = {
-            "custom_id": compute_hash(src),
+            "custom_id": custom_id,
             "method": "POST",
             "url": endpoint,
             "body": body,
         }
-        fout.write(
-            json.dumps(request, separators=(",", ":"), ensure_ascii=False) + "\n"
+        shard = writer.write(
+            json.dumps(request, separators=(",", ":"), ensure_ascii=False)
         )
+        requests[custom_id] = {"shard": shard, "hashes": [hash for hash, _ in batch]}
+    writer.close()
+
+    manifest = {
+        "corpus": args.corpus,
+        "prompt": args.prompt,
+        "model": model,
+        "batch_size": args.batch_size,
+        "submission": submission,
+        "shards": writer.shards,
+        "requests": requests,
+    }
+    with open(args.output + ".manifest.json", "w") as f:
+        json.dump(manifest, f, indent=1)
+    print(
+        f"{len(tasks)} strings in {len(requests)} requests,",
+        f"{len(writer.shards)} shards, {len(corpus) - len(tasks)} skipped",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,30 +3,191 @@
 # This file is licensed under the MIT License.
 # See the LICENSE file for more information.
 
-import sys
+import argparse
+import ast
+import gzip
 import json
+import os
+from collections import Counter
+from contextlib import nullcontext
+from functools import partial
+from multiprocessing import Pool
+from i18n_common import compute_hash
+from reply_parser import ReplyParser
+from validator import Validator, load_errata
 
-input_file = sys.argv[1]
-output_file = sys.argv[2]
-
-
-def get_message(code):
-    exec(code)
-    return locals()["message"]
-
-
-with open(input_file, "r") as f:
-    with open(output_file, "w") as out:
-        for line in f.read().splitlines():
-            res = json.loads(line)
-            try:
-                content = res["response"]["body"]["choices"][0]["message"]["content"]
-                hashval = res["custom_id"]
-                start = content.find("\n", content.find("```"))
-                end = content.find("```", start + 1)
-                eval_code = content[start + 1 : end]
-                msg = get_message(eval_code)
-                if msg:
-                    out.write(f"{hashval}: {repr(msg)}\n")
-            except Exception:
-                pass
+# State of the worker processes, set by init_worker().
+worker_state = None
+
+
+def init_worker(corpus_map, errata_map, requests):
+    global worker_state
+    worker_state = (corpus_map, Validator(errata_map), requests)
+
+
+def parse_result(line):
+    """Parse and validate one line of a batch output file.
+
+    Returns the valid (hash, translation) pairs and the number of rejected
+    strings of each reason."""
+    corpus_map, validator, requests = worker_state
+    reasons = Counter()
+    try:
+        res = json.loads(line)
+        custom_id = res["custom_id"]
+        content = res["response"]["body"]["choices"][0]["message"]["content"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        reasons["no response"] += 1
+        return [], reasons
+    if requests is None:
+        # Legacy requests of a single string, identified by its hash.
+        hashes = [custom_id]
+    elif custom_id in requests:
+        hashes = requests[custom_id]
+    else:
+        reasons["unknown request"] += 1
+        return [], reasons
+
+    entries = dict()
+
+    def on_entry(idx, value):
+        entries.setdefault(idx, value)
+
+    def on_error(idx):
+        entries.setdefault(idx, None)
+
+    parser = ReplyParser(on_entry, on_error)
+    parser.feed(content)
+    parser.close()
+
+    accepted = []
+    for idx, hash in enumerate(hashes):
+        if hash not in corpus_map:
+            reason = "unknown hash"
+        elif not parser.seen_code:
+            reason = "missing fence"
+        elif idx not in entries:
+            reason = "missing entry"
+        elif entries[idx] is None:
+            reason = "parse error"
+        else:
+            reason = validator.validate(corpus_map[hash], entries[idx])
+        if reason is None:
+            accepted.append((hash, entries[idx]))
+        else:
+            reasons[reason] += 1
+    return accepted, reasons
+
+
+def open_results(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def read_lines(paths):
+    for path in paths:
+        with open_results(path) as f:
+            for line in f:
+                if len(line.strip()) != 0:
+                    yield line
+
+
+def read_translation(path):
+    translation = dict()
+    if not os.path.exists(path):
+        return translation
+    with open(path) as f:
+        for line in f:
+            if line.startswith("H"):
+                translation[line[:13]] = ast.literal_eval(line[15:])
+    return translation
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge batch API results into a translation file"
+    )
+    parser.add_argument("corpus", help="Path to the corpus file")
+    parser.add_argument("errata", help="Path to the errata file")
+    parser.add_argument("translation", help="Translation file to merge into")
+    parser.add_argument(
+        "results", nargs="+", help="Batch output files (.jsonl or .jsonl.gz)"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Manifest written by translate_batch.py. Without it, each request "
+        "is expected to translate the string whose hash is its custom_id",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Replace existing valid translations with the imported ones",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to parse the results",
+    )
+    args = parser.parse_args()
+
+    corpus = list(open(args.corpus).read().splitlines())
+    corpus_hashes = []
+    corpus_map = dict()
+    for strval in corpus:
+        src = ast.literal_eval(strval)
+        hash = compute_hash(src)
+        corpus_map[hash] = src
+        corpus_hashes.append((strval, hash))
+    errata_map = load_errata(args.errata)
+    requests = None
+    if args.manifest is not None:
+        with open(args.manifest) as f:
+            requests = {
+                custom_id: request["hashes"]
+                for custom_id, request in json.load(f)["requests"].items()
+            }
+
+    validator = Validator(errata_map)
+    translation = dict()
+    for key, value in read_translation(args.translation).items():
+        if key in corpus_map and validator.validate(corpus_map[key], value) is None:
+            translation[key] = value
+
+    imported = dict()
+    reasons = Counter()
+    initargs = (corpus_map, errata_map, requests)
+    if args.jobs <= 1:
+        init_worker(*initargs)
+    with (
+        Pool(args.jobs, init_worker, initargs) if args.jobs > 1 else nullcontext()
+    ) as pool:
+        mapper = partial(pool.imap, chunksize=64) if args.jobs > 1 else map
+        for accepted, line_reasons in mapper(parse_result, read_lines(args.results)):
+            reasons.update(line_reasons)
+            for hash, value in accepted:
+                imported.setdefault(hash, value)
+
+    merged = 0
+    for hash, value in imported.items():
+        if args.overwrite or hash not in translation:
+            translation[hash] = value
+            merged += 1
+
+    tmp_path = args.translation + ".tmp"
+    with open(tmp_path, "w") as f:
+        for strval, hash in corpus_hashes:
+            if hash in translation:
+                f.write(f"# {strval}\n{hash}: {repr(translation[hash])}\n")
+    os.replace(tmp_path, args.translation)
+
+    print("Accepted:", len(imported))
+    print("Merged:", merged)
+    for reason, count in reasons.most_common():
+        print(f"{reason}: {count}")
+
+
+if __name__ == "__main__":
+    main()
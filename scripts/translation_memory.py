@@ -0,0 +1,173 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import ast
+import re
+from collections import Counter
+
+
+def argument_spans(strval):
+    """Return the (start, end) spans of the argument indices of the clang
+    format specifiers in `strval`, e.g. the digits of `%0`, `%q1` and
+    `%select{...}2`, and both indices of `%diff{...}0,1`."""
+    spans = []
+    # One entry per open brace: True if it opens the argument of a modifier.
+    braces = []
+
+    def take_index(pos):
+        if pos < len(strval) and strval[pos].isdigit():
+            spans.append((pos, pos + 1))
+            pos += 1
+            if (
+                pos + 1 < len(strval)
+                and strval[pos] == ","
+                and strval[pos + 1].isdigit()
+            ):
+                spans.append((pos + 1, pos + 2))
+                pos += 2
+        return pos
+
+    pos = 0
+    while pos < len(strval):
+        ch = strval[pos]
+        if ch == "%":
+            pos += 1
+            if pos < len(strval) and strval[pos] == "%":
+                pos += 1
+                continue
+            while pos < len(strval) and (strval[pos].isalpha() or strval[pos] == "_"):
+                pos += 1
+            if pos < len(strval) and strval[pos] == "<":
+                end = strval.find(">", pos)
+                if end != -1:
+                    pos = end + 1
+            if pos < len(strval) and strval[pos] == "{":
+                braces.append(True)
+                pos += 1
+            else:
+                pos = take_index(pos)
+            continue
+        if ch == "{":
+            braces.append(False)
+        elif ch == "}" and len(braces) != 0:
+            if braces.pop():
+                pos = take_index(pos + 1)
+                continue
+        pos += 1
+    return spans
+
+
+def renumber(strval, mapping):
+    """Replace the argument indices of `strval` according to `mapping`.
+    Returns None if an index is not in `mapping`."""
+    res = ""
+    last = 0
+    for start, end in argument_spans(strval):
+        index = strval[start:end]
+        if index not in mapping:
+            return None
+        res += strval[last:start] + mapping[index]
+        last = end
+    return res + strval[last:]
+
+
+def normalize(strval):
+    """Return (key, order): `strval` with its arguments renumbered in order of
+    first appearance, and the original indices in that order. Strings that
+    only differ in argument numbering share the same key."""
+    order = []
+    for start, end in argument_spans(strval):
+        if strval[start:end] not in order:
+            order.append(strval[start:end])
+    mapping = {index: str(i) for i, index in enumerate(order)}
+    return renumber(strval, mapping), order
+
+
+word_pattern = re.compile(r"\w+|%")
+
+
+def fuzzy_terms(strval):
+    """Return the unigrams and bigrams of the lowercased words of `strval`.
+    Punctuation is ignored and every argument is reduced to `%`."""
+    key, _ = normalize(strval)
+    words = word_pattern.findall(re.sub(r"%[a-z_]*\d", "%", key.lower()))
+    terms = set(words)
+    terms.update(zip(words, words[1:]))
+    return terms
+
+
+def read_pairs(path):
+    """Yield (source, translation) pairs of a translation file, taking the
+    source from the comment line preceding each entry."""
+    src = None
+    with open(path) as f:
+        for line in f:
+            try:
+                if line.startswith("# "):
+                    src = ast.literal_eval(line[2:])
+                elif line.startswith("H") and src is not None:
+                    yield src, ast.literal_eval(line[15:])
+                    src = None
+            except (SyntaxError, ValueError):
+                src = None
+
+
+class TranslationMemory:
+    """Index of reviewed translations.
+
+    lookup() reuses a translation whose source is identical up to argument
+    numbering. similar() returns the entries sharing the most word unigrams
+    and bigrams with a string, found through an inverted index; terms
+    occurring in more than `max_df` entries are not used to find candidates."""
+
+    def __init__(self, max_df=1000):
+        self.max_df = max_df
+        self.exact = dict()
+        self.entries = []
+        self.postings = dict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, src, tgt):
+        key, order = normalize(src)
+        if key in self.exact:
+            return
+        self.exact[key] = (order, tgt)
+        idx = len(self.entries)
+        terms = fuzzy_terms(src)
+        self.entries.append((src, tgt, terms))
+        for term in terms:
+            self.postings.setdefault(term, []).append(idx)
+
+    def lookup(self, src):
+        """Return the translation of `src` adapted from an entry with the same
+        normalized source, or None."""
+        key, order = normalize(src)
+        if key not in self.exact:
+            return None
+        entry_order, tgt = self.exact[key]
+        return renumber(tgt, dict(zip(entry_order, order)))
+
+    def similar(self, src, limit=3, threshold=0.5):
+        """Return up to `limit` (source, translation, score) entries whose
+        Jaccard similarity with `src` is at least `threshold`, best first."""
+        terms = fuzzy_terms(src)
+        shared = Counter()
+        for term in terms:
+            postings = self.postings.get(term, [])
+            if len(postings) <= self.max_df:
+                shared.update(postings)
+        res = []
+        for idx, _ in shared.most_common(limit * 4):
+            entry_src, entry_tgt, entry_terms = self.entries[idx]
+            if entry_src == src:
+                continue
+            common = len(terms.intersection(entry_terms))
+            score = common / (len(terms) + len(entry_terms) - common)
+            if score >= threshold:
+                res.append((entry_src, entry_tgt, score))
+        res.sort(key=lambda x: -x[2])
+        return res[:limit]
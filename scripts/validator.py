@@ -0,0 +1,304 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import argparse
+import ast
+import re
+import sys
+from collections import Counter
+from i18n_common import compute_hash, read_corpus
+
+keys = [
+    "%0",
+    "%1",
+    "%2",
+    "%3",
+    "%4",
+    "%5",
+    "%6",
+    "%7",
+    "%8",
+    "%9",
+    "%select{",
+    "%enum_select<",
+    "%plural{",
+    "%ordinal",
+    "%human",
+    "%objcclass",
+    "%objcinstance",
+    "%q",
+    "%diff{",
+    "%sub{",
+    "|",
+    "{",
+    "}",
+    "\\",
+    "\\n",
+    "consteval",
+    "constexpr",
+    "constinit",
+    "const_cast",
+    "dynamic_cast",
+    "reinterpret_cast",
+    "static_cast",
+    "typeid",
+    "typename",
+    "co_await",
+    "co_return",
+    "co_yield",
+    "alignas",
+    "alignof",
+    "decltype",
+    "goto",
+    "noexcept",
+    "nullptr",
+    "static_assert",
+    "thread_local",
+    "#pragma",
+    "X86",
+    "ARM",
+    "AArch64",
+    "RISCV",
+    "RISC-V",
+    "MIPS",
+    "SPARC",
+    "PowerPC",
+    "Alpha",
+    "AMDGPU",
+    "M68k",
+    "SystemZ",
+    "NVPTX",
+    "WebAssembly",
+    "JIT",
+    "GNU",
+    "MSVC",
+    "DXIL",
+    "Visual Studio",
+]
+
+
+def load_errata(path):
+    errata_map = dict()
+    for strval in open(path).read().splitlines():
+        pos = strval.find(" ")
+        if pos == -1:
+            continue
+        errata_map[strval[:pos]] = strval[pos + 1 :]
+    return errata_map
+
+
+def trie_regex(node):
+    alternatives = [re.escape(ch) + trie_regex(node[ch]) for ch in sorted(node) if ch]
+    if len(alternatives) == 0:
+        return ""
+    body = (
+        alternatives[0]
+        if len(alternatives) == 1
+        else "(?:" + "|".join(alternatives) + ")"
+    )
+    # Greedy, so the longest pattern wins.
+    return "(?:" + body + ")?" if "" in node else body
+
+
+def compile_patterns(patterns):
+    """Compile a regex reporting, at every position, the longest pattern
+    starting there. Overlapping occurrences are all reported.
+
+    The patterns are merged into a trie so that each position is rejected
+    after a few character comparisons."""
+    trie = dict()
+    for pattern in patterns:
+        node = trie
+        for ch in pattern:
+            node = node.setdefault(ch, dict())
+        node[""] = True
+    return re.compile("(?=(" + trie_regex(trie) + "))")
+
+
+class Validator:
+    """Checks that a translation keeps the placeholders and keywords of its
+    source and respects the errata of the locale.
+
+    All keys are counted in a single scan of each string; a key that is a
+    prefix of another one (e.g. "\\" of "\\n") is counted through the longer
+    match. Errata terms are looked up the same way, so a term that is a
+    prefix of another one ("pipe" of "pipeline") is found through the longer
+    match."""
+
+    def __init__(self, errata_map):
+        self.key_pattern = compile_patterns(keys)
+        self.implied = []
+        for k in keys:
+            for p in keys:
+                if p != k and k.startswith(p):
+                    self.implied.append((k, p))
+
+        self.errata = dict()
+        for k, v in errata_map.items():
+            should_contain = k.startswith("!")
+            term = k[1:] if should_contain else k
+            for variant in set([term, term.capitalize()]):
+                self.errata.setdefault(variant, []).append((term, v, should_contain))
+        self.errata_pattern = compile_patterns(self.errata) if self.errata else None
+        self.errata_prefixes = dict()
+        for k in self.errata:
+            self.errata_prefixes[k] = [p for p in self.errata if k.startswith(p)]
+
+    def count_keys(self, strval):
+        """Return the number of occurrences of every key in `strval`."""
+        counts = Counter(self.key_pattern.findall(strval))
+        for k, p in self.implied:
+            if k in counts:
+                counts[p] += counts[k]
+        return counts
+
+    def validate(self, src, tgt):
+        """Return None if `tgt` is a valid translation of `src`, otherwise the
+        reason of the failure."""
+        if not isinstance(tgt, str):
+            return "not a string"
+        src_matches = self.key_pattern.findall(src)
+        tgt_matches = self.key_pattern.findall(tgt)
+        # Counts of keys that are prefixes of others are determined by the
+        # longest matches, so comparing those is enough.
+        if sorted(src_matches) != sorted(tgt_matches):
+            src_counts = self.count_keys(src)
+            tgt_counts = self.count_keys(tgt)
+            for k in keys:
+                if src_counts[k] != tgt_counts[k]:
+                    return f"placeholder {k}"
+        if self.errata_pattern is None:
+            return None
+        variants = set()
+        for match in set(self.errata_pattern.findall(src)):
+            variants.update(self.errata_prefixes[match])
+        seen = set()
+        for variant in variants:
+            for term, v, should_contain in self.errata[variant]:
+                if (term, v, should_contain) in seen:
+                    continue
+                seen.add((term, v, should_contain))
+                if should_contain:
+                    if v not in tgt:
+                        return f"errata !{term}"
+                elif v in tgt:
+                    return f"errata {term}"
+        return None
+
+    def validate_file(self, path, corpus_map):
+        """Validate every entry of a translation file.
+
+        Yields (hash, reason) for each entry, where reason is None for valid
+        entries and "unknown hash" for entries that are not in the corpus."""
+        with open(path) as f:
+            for line in f:
+                if not line.startswith("H"):
+                    continue
+                key = line[:13]
+                if key not in corpus_map:
+                    yield key, "unknown hash"
+                    continue
+                yield key, self.validate(corpus_map[key], ast.literal_eval(line[15:]))
+
+
+def reference_validate(src, tgt, errata_map):
+    """Straightforward version of Validator.validate, checking every key and
+    errata entry in turn."""
+    if not isinstance(tgt, str):
+        return "not a string"
+    for k in keys:
+        if src.count(k) != tgt.count(k):
+            return f"placeholder {k}"
+    for k, v in errata_map.items():
+        should_contain = k.startswith("!")
+        term = k[1:] if should_contain else k
+        if term in src or term.capitalize() in src:
+            if should_contain:
+                if v not in tgt:
+                    return f"errata !{term}"
+            elif v in tgt:
+                return f"errata {term}"
+    return None
+
+
+def self_test():
+    """Compare Validator with reference_validate on overlapping keys and
+    errata terms. Return the number of disagreements."""
+    errata_map = {
+        "pipe": "管",
+        "pipeline": "流水线",
+        "line": "线",
+        "!loop": "循环",
+        "loop nest": "嵌套",
+    }
+    cases = [
+        ("a pipeline", "一个管流水线"),
+        ("a pipeline", "一个流水线"),
+        ("a pipeline", "一个管"),
+        ("a Pipeline", "一个管道"),
+        ("the pipe", "管"),
+        ("inline", "内联线"),
+        ("a loop nest", "一个循环"),
+        ("a loop nest", "一个嵌套"),
+        ("%0\\n", "%0\\n"),
+        ("%0\\n", "%0\\"),
+        ("%select{a|b}0", "%select{a|b|c}0"),
+    ]
+    validator = Validator(errata_map)
+    failures = 0
+    for src, tgt in cases:
+        expected = reference_validate(src, tgt, errata_map)
+        actual = validator.validate(src, tgt)
+        if (expected is None) != (actual is None):
+            print(f"Mismatch: {src!r} -> {tgt!r}: {actual}, expected {expected}")
+            failures += 1
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate a translation file against the corpus"
+    )
+    parser.add_argument("corpus", nargs="?", help="Path to the corpus file")
+    parser.add_argument("errata", nargs="?", help="Path to the errata file")
+    parser.add_argument("translation", nargs="?", help="Path to the translation file")
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="List every rejected entry"
+    )
+    parser.add_argument(
+        "--self-test",
+        action="store_true",
+        help="Compare the validator with a straightforward implementation on "
+        "built-in cases and exit",
+    )
+    args = parser.parse_args()
+
+    if args.self_test:
+        failures = self_test()
+        print("Self-test:", "failed" if failures else "passed")
+        sys.exit(1 if failures else 0)
+    if args.translation is None:
+        parser.error("the corpus, errata and translation files are required")
+
+    corpus_map = dict()
+    for strval in read_corpus(args.corpus):
+        corpus_map[compute_hash(strval)] = strval
+    validator = Validator(load_errata(args.errata))
+    reasons = Counter()
+    total = 0
+    for key, reason in validator.validate_file(args.translation, corpus_map):
+        total += 1
+        if reason is not None:
+            reasons[reason] += 1
+            if args.verbose:
+                print(f"{key}: {reason}")
+    print("Entries:", total)
+    print("Valid:", total - sum(reasons.values()))
+    for reason, count in reasons.most_common():
+        print(f"{reason}: {count}")
+
+
+if __name__ == "__main__":
+    main()
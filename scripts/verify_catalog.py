@@ -0,0 +1,121 @@
+# SPDX-License-Identifier: MIT License
+# Copyright (c) 2025 Yingwei Zheng
+# This file is licensed under the MIT License.
+# See the LICENSE file for more information.
+
+import argparse
+import os
+import random
+import sys
+from compile_catalog import (
+    KEY_SIZE,
+    SHARDS,
+    Catalog,
+    read_shards,
+    read_sources,
+    read_translation,
+    split_translation,
+)
+from i18n_common import compute_hash, read_corpus
+
+
+def verify(catalog, translation, sources, corpus, samples, rng):
+    """Yield a description of every mismatch between a catalog and the
+    translation file it was compiled from."""
+    if catalog.size != len(translation):
+        yield f"{catalog.size} entries, expected {len(translation)}"
+    stored = set()
+    for slot in range(catalog.size):
+        pos = catalog.keys_offset + slot * KEY_SIZE
+        stored.add("H" + catalog.data[pos : pos + KEY_SIZE].hex().upper())
+    for key in stored.symmetric_difference(translation):
+        yield f"{key}: {'missing' if key in translation else 'unexpected'} key"
+
+    for key, value in translation.items():
+        if catalog.lookup_key(bytes.fromhex(key[1:])) != value:
+            yield f"{key}: wrong translation"
+    for key, strval in sources.items():
+        if key in translation and not catalog.may_contain(strval):
+            yield f"{key}: rejected by the prefilter"
+    for strval in corpus:
+        if catalog.lookup(strval) != translation.get(compute_hash(strval)):
+            yield f"{compute_hash(strval)}: wrong lookup of {strval!r}"
+    for _ in range(samples):
+        key = rng.randbytes(KEY_SIZE)
+        if "H" + key.hex().upper() in translation:
+            continue
+        if catalog.lookup_key(key) is not None:
+            yield f"H{key.hex().upper()}: non-member accepted"
+
+
+def prefilter_pass_rate(catalog, corpus, samples, rng):
+    """Return the fraction of random fragments of corpus strings, such as
+    those written by unbuffered streams, accepted by the prefilter."""
+    accepted = 0
+    for _ in range(samples):
+        strval = rng.choice(corpus)
+        begin = rng.randrange(len(strval) + 1)
+        end = rng.randrange(begin, len(strval) + 1)
+        accepted += catalog.may_contain(strval[begin:end])
+    return accepted / max(samples, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that catalogs return exactly the translations of "
+        "their translation files"
+    )
+    parser.add_argument("corpus", help="Path to the corpus file")
+    parser.add_argument("catalogs", nargs="+", help="Catalog files")
+    parser.add_argument(
+        "--i18n-dir",
+        help="Directory of the translation files (default: next to each catalog)",
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=100000,
+        help="Number of random non-member keys looked up",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the samples")
+    parser.add_argument(
+        "--index",
+        help="SQLite index the shards (<lang>.<shard>.catalog) were split with",
+    )
+    args = parser.parse_args()
+
+    corpus = read_corpus(args.corpus)
+    rng = random.Random(args.seed)
+    shards = read_shards(args.index) if args.index is not None else None
+    failed = False
+    for path in args.catalogs:
+        lang, _, shard = os.path.basename(path).removesuffix(".catalog").partition(".")
+        translation_path = os.path.join(
+            args.i18n_dir or os.path.dirname(path), lang + ".yml"
+        )
+        translation = read_translation(translation_path)
+        sources = read_sources(translation_path)
+        if shard:
+            if shards is None or shard not in SHARDS:
+                print(f"{path}: unknown shard, pass the index with --index")
+                failed = True
+                continue
+            translation = split_translation(translation, shards)[shard]
+        with open(path, "rb") as f:
+            catalog = Catalog(f.read())
+        errors = 0
+        for error in verify(catalog, translation, sources, corpus, args.samples, rng):
+            if errors < 10:
+                print(f"{path}: {error}")
+            errors += 1
+        print(f"{path}: {catalog.size} entries, {errors} errors")
+        if catalog.filter_bits != 0:
+            rate = prefilter_pass_rate(catalog, corpus, args.samples, rng)
+            print(f"{path}: prefilter accepts {rate:.2%} of random fragments")
+        failed = failed or errors != 0
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()